@@ -1,35 +1,48 @@
 from autogen import AssistantAgent as AA
-import config, base
-from typing import Tuple
-from concurrent.futures import ThreadPoolExecutor
+from . import config, base
+from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextvars import copy_context
+import time
+from app.services.tracing import span
+from app.services.prompts import prompts
+from app.services.cassette import http_client
 
 
 class SummarizeAgent(base.Agent):
     """Summarizer Agent"""
 
-    def __init__(self, search_result: str):
+    def __init__(self, search_result: str, timeout: Optional[float] = None):
         super().__init__()
         self.name = "Summarizer Agent"
         self.search_result = search_result
+        self.timeout = timeout
 
     def run(self, **kwargs) -> str:
-        budgetman, qualityman, wiseman, main = self.load_agents()
+        with span("summarize.run"):
+            budgetman, qualityman, wiseman, main = self.load_agents(self.timeout)
 
-        response = self.generate_response(budgetman, qualityman, wiseman, main, self.search_result)
+            response = self.generate_response(budgetman, qualityman, wiseman, main, self.search_result, self.timeout)
         return response
     
     @staticmethod
-    def load_agents() -> Tuple[AA, AA, AA, AA]:
-        """Load agents."""
+    def load_agents(timeout: Optional[float] = None) -> Tuple[AA, AA, AA, AA]:
+        """Load agents. ``timeout`` bounds each upstream LLM call in seconds."""
 
         llmconfig = config.llmconfig()
+        if timeout is not None:
+            llmconfig["llm_config"]["timeout"] = timeout
+        client = http_client()
+        if client is not None:
+            # Route persona calls through the record/replay transport
+            llmconfig["llm_config"]["http_client"] = client
 
         def create_budgetman() -> AA:
             return AA(
                 code_execution_config={"use_docker": False},
                 llm_config=llmconfig["llm_config"],
                 name="budgetman",
-                system_message="You look for affordable products all the time. Saving money if your life goal. give me a summary and review then evaluate the product, should user buy it or no?, talk to user",
+                system_message=prompts.text("summarize.budgetman"),
             )
 
         def create_qualityman() -> AA:
@@ -37,7 +50,7 @@ class SummarizeAgent(base.Agent):
             code_execution_config={"use_docker": False},
             llm_config=llmconfig["llm_config"],
             name="qualityman",
-            system_message="You look for high quality products all the time. Just quality and reliabilty are important. You look for well known brands, give me a summary, review then evaluate the product, should user buy it?, talk to user",
+            system_message=prompts.text("summarize.qualityman"),
             )
 
         def create_wiseman() -> AA:
@@ -45,7 +58,7 @@ class SummarizeAgent(base.Agent):
             code_execution_config={"use_docker": False},
             llm_config=llmconfig["llm_config"],
             name="wiseman",
-            system_message="You are wiseman so your choice are logical and based on facts in all aspects. give me a summary, review then evaluate the product, should user buy it?, talk to user",
+            system_message=prompts.text("summarize.wiseman"),
             )
 
         def create_main() -> AA:
@@ -53,12 +66,7 @@ class SummarizeAgent(base.Agent):
             code_execution_config={"use_docker": False},
             llm_config=llmconfig["llm_config"],
             name="Coordinator",
-            system_message=
-                "You are a coordinator that receives the outputs of multiple agents and creates a final summary report."
-                + "Make sure to integrate all perspectives into a unified output."
-                + "Evaluate the product, guide user and suggest the product if it meets the needs."
-                + "you suggest it, give user tips and advices"
-                + "Response with one sentence for reiview, one for advices and one for conclusion that who should buy this product and who should avoid it"
+            system_message=prompts.text("summarize.coordinator"),
             )
         
         with ThreadPoolExecutor() as executor:
@@ -72,37 +80,79 @@ class SummarizeAgent(base.Agent):
 
         return (budgetman, qualityman, wiseman, main)
 
+    @staticmethod
+    def _last_usage(agent: AA) -> Optional[dict]:
+        """Token usage of the agent's calls so far, in chat ``usage`` form.
+
+        Agents are created per run and reply once, so the running total is the
+        usage of that reply. autogen does not surface ``cached_tokens``, so
+        these calls show up as untracked in the prompt cache report.
+        """
+        summary = getattr(agent.client, "actual_usage_summary", None) if agent.client else None
+        if not summary:
+            return None
+        prompt_tokens = sum(v.get("prompt_tokens", 0) for v in summary.values() if isinstance(v, dict))
+        return {"prompt_tokens": prompt_tokens}
+
     @staticmethod
     def generate_response(budgetman_agent: AA
                        , qualityman_agent: AA
                        , wiseman_agent: AA
                        , main_agent: AA
-                       , search_result: str) -> str:
-        """Generate response from the agents."""
+                       , search_result: str
+                       , timeout: Optional[float] = None) -> str:
+        """Generate response from the agents.
 
-        def get_reply(agent: AA) -> str:
-            return agent.generate_reply([{"role": "user", "content": search_result}])
+        With a ``timeout`` (seconds for the whole fan-out and the coordinator),
+        a ``TimeoutError`` is raised as soon as it passes and persona replies
+        that have not started yet are cancelled instead of being waited for.
+        """
 
-        with ThreadPoolExecutor() as executor:
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def remaining() -> Optional[float]:
+            return None if deadline is None else max(deadline - time.monotonic(), 0.0)
+
+        def get_reply(agent: AA, content: str) -> str:
+            with span(f"summarize.{agent.name}"):
+                reply = agent.generate_reply([{"role": "user", "content": content}])
+            prompts.record_usage(f"summarize.{agent.name.lower()}", SummarizeAgent._last_usage(agent))
+            return reply
+
+        def submit(agent: AA, content: str):
+            # Each reply runs in a copy of the caller's context to stay in its trace
+            return executor.submit(copy_context().run, get_reply, agent, content)
+
+        # Not a context manager: leaving it would block on abandoned replies
+        executor = ThreadPoolExecutor()
+        try:
             futures = {
-                "budgetman": executor.submit(get_reply, budgetman_agent),
-                "qualityman": executor.submit(get_reply, qualityman_agent),
-                "wiseman": executor.submit(get_reply, wiseman_agent)
+                "budgetman": submit(budgetman_agent, search_result),
+                "qualityman": submit(qualityman_agent, search_result),
+                "wiseman": submit(wiseman_agent, search_result)
             }
+            _, pending = wait(futures.values(), timeout=remaining())
+            if pending:
+                raise TimeoutError(f"Persona replies did not finish within {timeout}s")
 
             bresponse = futures["budgetman"].result()
             qresponse = futures["qualityman"].result()
             wresponse = futures["wiseman"].result()
 
-        combined_input = (
-            f"budgetman: {bresponse}\n"
-            f"qualityman: {qresponse}\n"
-            f"wiseman: {wresponse}"
-        )
+            combined_input = (
+                f"budgetman: {bresponse}\n"
+                f"qualityman: {qresponse}\n"
+                f"wiseman: {wresponse}"
+            )
 
-        final_response = main_agent.generate_reply([{"role": "user", "content": combined_input}])
+            final = submit(main_agent, combined_input)
+            _, pending = wait([final], timeout=remaining())
+            if pending:
+                raise TimeoutError(f"Coordinator reply did not finish within {timeout}s")
+            final_response = final.result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
         return final_response
 
-
 if __name__ == "__main__":
     print(SummarizeAgent("Macbook Air 2019, 12GB RAM, 512GB storage").run())
\ No newline at end of file
@@ -1,7 +1,8 @@
 import json
+from pathlib import Path
 
 def llmconfig() -> dict:
-    with open("./config.json", "r") as f:
+    with open(Path(__file__).with_name("config.json"), "r") as f:
         config = json.load(f)
     
     config = {
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Union
+from typing import BinaryIO, Optional, Tuple, Union
 from pathlib import Path
 import base64, json
 import io
@@ -8,34 +8,50 @@ import httpx
 from .base import Agent
 from .config import settings
 from openai import OpenAI
+from app.services.tracing import record_usage, span
+from app.services.prompts import prompts
+from app.services.cassette import http_client
 
-
-_JSON_SIG = """You are a product expert. Extract brand and model. You Only use latin.
-Return ONLY valid JSON exactly with keys `brand` and `model` in lowercase Latin letters.
-If unknown, output {"brand": null, "model": null}."""
+# Formats the vision API accepts as-is; anything else is re-encoded as JPEG
+_PASSTHROUGH_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp", "GIF": "image/gif"}
+_MAX_SIDE = 2048
 
 class ProductClassifierAgent(Agent):
     name = "product-identifier"
 
-    def run(self, inp: Union[str, Path, Image.Image]):
-        if isinstance(inp, (str, Path)) and Path(inp).suffix:
-            img = Image.open(inp)
-            content = self._img2b64(img)
+    def run(self, inp: Union[str, Path, Image.Image, BinaryIO], timeout: Optional[float] = None):
+        mime = "image/jpeg"
+        # Plain text may contain dots ("iphone 12 6.1"), so only treat strings
+        # that name an existing file as image paths
+        if isinstance(inp, Path) or (isinstance(inp, str) and Path(inp).suffix and Path(inp).is_file()):
+            with open(inp, "rb") as fp:
+                content, mime = self._file2b64(fp)
             mode = "image"
         elif isinstance(inp, Image.Image):
             content = self._img2b64(inp)
             mode = "image"
+        elif hasattr(inp, "read"):
+            # Uploaded file object, e.g. a spooled temp file
+            content, mime = self._file2b64(inp)
+            mode = "image"
         else:
             content = str(inp)
             mode = "text"
 
-        payload = self._build_payload(content, mode)
+        payload = self._build_payload(content, mode, mime)
         client = OpenAI(
             api_key=settings.OPENAI_API_KEY,
-            base_url="https://api.metisai.ir/openai/v1"
+            base_url="https://api.metisai.ir/openai/v1",
+            http_client=http_client(),
         )
         # Use the OpenAI client for chat completion (sync)
-        response = client.chat.completions.create(**payload)
+        if timeout is not None:
+            payload["timeout"] = timeout
+        with span("topic.classify", mode=mode, model=payload["model"]) as classify_span:
+            response = client.chat.completions.create(**payload)
+            usage = response.model_dump().get("usage")
+            record_usage(classify_span, usage)
+        prompts.record_usage("product_identifier", usage)
         msg = response.choices[0].message.content.strip()
         try:
             js = json.loads(msg)
@@ -51,12 +67,36 @@ class ProductClassifierAgent(Agent):
         return base64.b64encode(buf.getvalue()).decode()
 
     @staticmethod
-    def _build_payload(content: str, mode: str):
+    def _file2b64(fp: BinaryIO) -> Tuple[str, str]:
+        """Base64-encode an image file for the vision API.
+
+        Files already in an accepted format and size are encoded straight
+        from their bytes without decoding pixels; others are downscaled and
+        re-encoded as JPEG.
+
+        Returns:
+            The base64 content and its MIME type.
+        """
+        fp.seek(0)
+        img = Image.open(fp)  # reads the header only
+        mime = _PASSTHROUGH_FORMATS.get(img.format or "")
+        if mime is not None and max(img.size) <= _MAX_SIDE:
+            fp.seek(0)
+            return base64.b64encode(fp.read()).decode(), mime
+        img.draft("RGB", (_MAX_SIDE, _MAX_SIDE))
+        img.thumbnail((_MAX_SIDE, _MAX_SIDE))
+        return ProductClassifierAgent._img2b64(img.convert("RGB")), "image/jpeg"
+
+    @staticmethod
+    def _build_payload(content: str, mode: str, mime: str = "image/jpeg"):
+        # Static prompt first and byte-identical every call so the provider
+        # can cache it; the listing text or image always comes last
+        system = prompts.text("product_identifier")
         if mode == "text":
             return {
                 "model": "gpt-4o-mini",
                 "messages": [
-                    {"role": "system", "content": _JSON_SIG},
+                    {"role": "system", "content": system},
                     {"role": "user", "content": content},
                 ],
                 "temperature": 0,
@@ -65,18 +105,18 @@ class ProductClassifierAgent(Agent):
         return {
             "model": "gpt-4o",
             "messages": [
-                {"role": "system", "content": _JSON_SIG},
+                {"role": "system", "content": system},
                 {
                     "role": "user",
                     "content": [
+                        {"type": "text", "text": "write the exact model of the product in this format"
+                        "brand: <model_name>"},
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/jpeg;base64,{content}",
+                                "url": f"data:{mime};base64,{content}",
                             },
                         },
-                        {"type": "text", "text": "write the exact model of the product in this format"
-                        "brand: <model_name>"},
                     ],
                 },
             ],
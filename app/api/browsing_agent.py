@@ -1,14 +1,25 @@
 """API endpoints for the browsing agent."""
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Request, Response
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 import traceback
 import logging
+from app.config import settings
 from app.services import Agent
 from app.services.tool import Tool
 from app.services.openai_service import OpenAIService
-from system_prompt import system_prompt
+from app.services.deadline import (
+    Deadline,
+    DeadlineExceeded,
+    parse_timeout_header,
+    run_with_deadline,
+)
+from app.services.idempotency import (
+    IdempotencyKeyConflict,
+    IdempotencyStore,
+    request_fingerprint,
+)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -57,7 +68,12 @@ browsing_tool = Tool(
 browsing_agent = Agent(
     model="gpt-4.1",
     tools=[browsing_tool],
-    system_message=system_prompt
+    prompt="browsing_agent",
+)
+
+idempotency_store = IdempotencyStore(
+    ttl_seconds=settings.idempotency_ttl_seconds,
+    max_entries=settings.idempotency_max_keys,
 )
 
 class ChatRequest(BaseModel):
@@ -65,17 +81,30 @@ class ChatRequest(BaseModel):
     message: str
     temperature: Optional[float] = None
     max_tokens: Optional[int] = None
+    tools: Optional[List[str]] = None
 
 class ChatResponse(BaseModel):
     """Response model for chat endpoint."""
     response: str
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest) -> ChatResponse:
+async def chat(
+    request: ChatRequest,
+    http_request: Request,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    request_timeout: Optional[str] = Header(None, alias="X-Request-Timeout"),
+) -> ChatResponse:
     """Chat with the browsing agent.
     
     Args:
-        request: The chat request containing the message and optional parameters.
+        request: The chat request containing the message and optional parameters,
+            including an optional subset of tool names to offer the model.
+        http_request: The raw HTTP request, watched for client disconnects.
+        response: The outgoing response, used to flag replayed results.
+        idempotency_key: Optional ``Idempotency-Key`` header. Retries with the
+            same key attach to the in-flight request or replay its response.
+        request_timeout: Optional ``X-Request-Timeout`` header in seconds.
         
     Returns:
         The agent's response.
@@ -83,14 +112,53 @@ async def chat(request: ChatRequest) -> ChatResponse:
     Raises:
         HTTPException: If there's an error processing the request.
     """
-    try:
-        logger.info(f"Received chat request: {request.message}")
-        response = browsing_agent.chat(
+    tools = None
+    if request.tools is not None:
+        tools = list(dict.fromkeys(request.tools))
+        if not tools:
+            raise HTTPException(status_code=422, detail="tools must name at least one tool")
+        unknown_tools = [name for name in tools if name not in browsing_agent.service.tools]
+        if unknown_tools:
+            raise HTTPException(status_code=422, detail=f"Unknown tools: {unknown_tools}")
+
+    deadline = Deadline(parse_timeout_header(
+        request_timeout,
+        default=settings.request_timeout_seconds,
+        maximum=settings.request_timeout_seconds,
+    ))
+
+    async def compute() -> ChatResponse:
+        reply = await run_with_deadline(
+            deadline,
+            browsing_agent.chat,
+            # A retry may attach to a keyed request, so keep it running when
+            # the original client goes away; the deadline still applies.
+            request=None if idempotency_key else http_request,
             message=request.message,
             temperature=request.temperature,
             max_tokens=request.max_tokens,
+            deadline=deadline,
+            tools=tools,
+        )
+        return ChatResponse(response=reply)
+
+    try:
+        logger.info(f"Received chat request: {request.message}")
+        if not idempotency_key:
+            return await compute()
+        result, replayed = await idempotency_store.run(
+            key=f"agent-chat:{idempotency_key}",
+            fingerprint=request_fingerprint(request.model_dump()),
+            compute=compute,
         )
-        return ChatResponse(response=response)
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+        return result
+    except IdempotencyKeyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except DeadlineExceeded as e:
+        logger.warning(f"Chat request stopped early: {str(e)}")
+        raise HTTPException(status_code=504, detail={"error": "timeout", "message": str(e)})
     except Exception as e:
         error_traceback = traceback.format_exc()
         logger.error(f"Error in chat endpoint: {str(e)}\n{error_traceback}")
@@ -0,0 +1,38 @@
+"""Debug endpoints for inspecting recent request traces."""
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from app.config import settings
+from app.services.tracing import Tracer
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+# Shared with TracingMiddleware in app.main
+tracer = Tracer(
+    sample_rate=settings.trace_sample_rate,
+    capacity=settings.trace_buffer_size,
+)
+
+@router.get("/traces")
+async def list_traces(limit: int = 50) -> dict:
+    """List the most recent traces, newest first."""
+    return {"traces": tracer.recent(limit)}
+
+@router.get("/traces/{trace_id}")
+async def get_trace(trace_id: str, format: Optional[str] = None):
+    """Return one trace as a waterfall of spans.
+
+    Args:
+        trace_id: The id from the ``X-Trace-Id`` response header.
+        format: ``text`` for a plain-text waterfall; JSON otherwise.
+
+    Raises:
+        HTTPException: If the trace is unknown or has been evicted.
+    """
+    trace = tracer.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"Trace {trace_id} not found")
+    if format == "text":
+        return PlainTextResponse(trace.render_waterfall())
+    return trace.to_dict()
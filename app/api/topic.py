@@ -0,0 +1,282 @@
+"""API endpoints for product identification."""
+
+from fastapi import APIRouter, Header, HTTPException, Request
+from pydantic import BaseModel
+from typing import Any, Awaitable, Callable, Dict, Optional
+from tempfile import SpooledTemporaryFile
+from PIL import Image, UnidentifiedImageError
+import json
+import logging
+from app.config import settings
+from app.services.deadline import (
+    Deadline,
+    DeadlineExceeded,
+    parse_timeout_header,
+    run_with_deadline,
+)
+from app.services.product_cache import ProductCache, canonical_key
+from app.services.warmer import RefreshAheadWarmer
+from TopicAgent.ProductTopic import ProductClassifierAgent
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/topic", tags=["topic"])
+
+classifier = ProductClassifierAgent()
+
+product_cache = ProductCache(
+    ttl_seconds=settings.product_cache_ttl_seconds,
+    max_entries=settings.product_cache_max_entries,
+)
+
+# Started and stopped by the app lifespan in app.main
+warmer = RefreshAheadWarmer(
+    product_cache,
+    top_k=settings.warmer_top_k,
+    min_requests=settings.warmer_min_requests,
+    refresh_ahead_seconds=settings.warmer_refresh_ahead_seconds,
+    interval_seconds=settings.warmer_interval_seconds,
+    max_refreshes_per_minute=settings.warmer_max_refreshes_per_minute,
+)
+
+class IdentifyResponse(BaseModel):
+    """Response model for the identify endpoint."""
+    brand_model: Optional[str]
+    mode: str
+
+class DescribeRequest(BaseModel):
+    """Request model for the describe endpoint."""
+    brand_model: str
+
+class DescribeResponse(BaseModel):
+    """Response model for the describe endpoint."""
+    brand_model: str
+    description: str
+    summary: str
+    cached: bool
+
+def _too_large(limit: Optional[int] = None) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Upload exceeds {limit or settings.topic_max_upload_bytes} bytes",
+    )
+
+def _max_text_bytes() -> int:
+    """Largest text body that can hold ``TOPIC_MAX_TEXT_CHARS`` characters.
+
+    Allows 6 bytes per character (a JSON ``\\uXXXX`` escape; UTF-8 needs at
+    most 4) plus room for the JSON wrapper and whitespace.
+    """
+    return settings.topic_max_text_chars * 6 + 1024
+
+def _check_content_length(request: Request) -> None:
+    """Reject uploads whose declared size is already over the limit."""
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > settings.topic_max_upload_bytes:
+        raise _too_large()
+
+def _limited_receive(
+    receive: Callable[[], Awaitable[Dict[str, Any]]],
+    limit: int,
+) -> Callable[[], Awaitable[Dict[str, Any]]]:
+    """Wrap an ASGI ``receive`` so the body is cut off once it passes ``limit``."""
+    received = 0
+
+    async def wrapped() -> Dict[str, Any]:
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > limit:
+                raise _too_large()
+        return message
+
+    return wrapped
+
+async def _spool_body(request: Request, limit: Optional[int] = None) -> SpooledTemporaryFile:
+    """Stream the raw request body into memory, rolling over to disk when large.
+
+    Args:
+        request: The incoming request.
+        limit: Maximum body size; defaults to ``TOPIC_MAX_UPLOAD_BYTES``.
+    """
+    limit = limit or settings.topic_max_upload_bytes
+    spool = SpooledTemporaryFile(max_size=settings.topic_spool_bytes)
+    size = 0
+    try:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > limit:
+                raise _too_large(limit)
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+def _check_image(fp: Any) -> None:
+    """Validate an uploaded image from its header, before decoding any pixels.
+
+    Raises:
+        HTTPException: 415 if it is not an image, 413 if it has too many pixels.
+    """
+    try:
+        with Image.open(fp) as img:
+            width, height = img.size
+    except Image.DecompressionBombError:
+        # Pillow refuses headers far beyond its own limit before we see them
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image exceeds the limit of {settings.topic_max_pixels} pixels",
+        )
+    except (UnidentifiedImageError, OSError):
+        raise HTTPException(status_code=415, detail="Upload is not a supported image")
+    if width * height > settings.topic_max_pixels:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image is {width}x{height}; limit is {settings.topic_max_pixels} pixels",
+        )
+    fp.seek(0)
+
+def _check_text(text: Any) -> str:
+    if text is not None and not isinstance(text, str):
+        raise HTTPException(status_code=422, detail="text must be a string")
+    text = (text or "").strip()
+    if not text:
+        raise HTTPException(status_code=422, detail="Send an image or non-empty text")
+    if len(text) > settings.topic_max_text_chars:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Text exceeds {settings.topic_max_text_chars} characters",
+        )
+    return text
+
+@router.post("/identify", response_model=IdentifyResponse)
+async def identify(
+    request: Request,
+    request_timeout: Optional[str] = Header(None, alias="X-Request-Timeout"),
+) -> IdentifyResponse:
+    """Identify the brand and model of a product from an image or text.
+
+    Accepts any of:
+
+    - ``multipart/form-data`` with a ``file`` image part or a ``text`` field
+    - a raw ``image/*`` (or ``application/octet-stream``) body
+    - a ``text/plain`` body, or JSON ``{"text": "..."}``
+
+    Uploads are streamed to a spooled temporary file, which moves to disk past
+    ``TOPIC_SPOOL_BYTES``, and are rejected as soon as they pass
+    ``TOPIC_MAX_UPLOAD_BYTES``. Image dimensions are checked from the header
+    before any pixels are decoded.
+
+    Raises:
+        HTTPException: On oversized, malformed or empty uploads, or a timeout.
+    """
+    _check_content_length(request)
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    deadline = Deadline(parse_timeout_header(
+        request_timeout,
+        default=settings.request_timeout_seconds,
+        maximum=settings.request_timeout_seconds,
+    ))
+
+    upload = None
+    form = None
+    try:
+        if content_type == "multipart/form-data":
+            limited = Request(request.scope, _limited_receive(request.receive, settings.topic_max_upload_bytes))
+            form = await limited.form(max_files=1, max_fields=4)
+            part = form.get("file")
+            if part is not None and not isinstance(part, str):
+                upload = part.file
+            else:
+                inp = _check_text(form.get("text"))
+        elif content_type.startswith("image/") or content_type == "application/octet-stream":
+            upload = await _spool_body(request)
+        elif content_type in ("text/plain", "application/json", ""):
+            body = await _spool_body(request, limit=_max_text_bytes())
+            try:
+                raw = body.read().decode("utf-8")
+            except UnicodeDecodeError:
+                raise HTTPException(status_code=400, detail="Text must be UTF-8")
+            finally:
+                body.close()
+            if content_type == "application/json":
+                try:
+                    raw = json.loads(raw).get("text")
+                except (ValueError, AttributeError):
+                    raise HTTPException(status_code=400, detail='Expected JSON {"text": "..."}')
+            inp = _check_text(raw)
+        else:
+            raise HTTPException(status_code=415, detail=f"Unsupported content type {content_type}")
+
+        if upload is not None:
+            _check_image(upload)
+            inp = upload
+
+        logger.info(f"Identifying product from {'image' if upload is not None else 'text'}")
+        try:
+            brand_model = await run_with_deadline(
+                deadline,
+                classifier.run,
+                inp,
+                request=request,
+                timeout=deadline.remaining(),
+            )
+        except Exception as e:
+            if not isinstance(e, DeadlineExceeded) and (deadline.expired or deadline.cancelled):
+                raise DeadlineExceeded("Product identification exceeded the request deadline") from e
+            raise
+        return IdentifyResponse(
+            brand_model=brand_model,
+            mode="image" if upload is not None else "text",
+        )
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail={"error": "timeout", "message": str(e)})
+    finally:
+        if form is not None:
+            await form.close()
+        elif upload is not None:
+            upload.close()
+
+@router.post("/describe", response_model=DescribeResponse)
+async def describe(
+    body: DescribeRequest,
+    request: Request,
+    request_timeout: Optional[str] = Header(None, alias="X-Request-Timeout"),
+) -> DescribeResponse:
+    """Describe and summarize a product identified by ``/topic/identify``.
+
+    Results are cached per canonical ``brand-model``. Every request counts
+    towards the product's popularity, and the warmer refreshes popular
+    products before their entry expires so they are served from cache.
+
+    Raises:
+        HTTPException: 422 on an empty product, 504 on a timeout.
+    """
+    key = canonical_key(body.brand_model)
+    if not key:
+        raise HTTPException(status_code=422, detail="brand_model must not be empty")
+    warmer.track(key)
+    deadline = Deadline(parse_timeout_header(
+        request_timeout,
+        default=settings.request_timeout_seconds,
+        maximum=settings.request_timeout_seconds,
+    ))
+    try:
+        # Not cancelled on disconnect, so a computation others may be waiting on finishes
+        try:
+            info, hit = await run_with_deadline(deadline, product_cache.get, key)
+        except Exception as e:
+            if not isinstance(e, DeadlineExceeded) and (deadline.expired or deadline.cancelled):
+                raise DeadlineExceeded("Product description exceeded the request deadline") from e
+            raise
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail={"error": "timeout", "message": str(e)})
+    return DescribeResponse(
+        brand_model=key,
+        description=info.description,
+        summary=info.summary,
+        cached=hit,
+    )
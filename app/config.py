@@ -0,0 +1,59 @@
+"""Application configuration."""
+
+from pydantic_settings import BaseSettings
+from dotenv import load_dotenv
+import os
+
+# Load environment variables
+load_dotenv()
+
+class Settings(BaseSettings):
+    """Application settings."""
+    api_host: str = os.getenv("API_HOST", "0.0.0.0")
+    api_port: int = int(os.getenv("API_PORT", "8000"))
+    debug: bool = os.getenv("DEBUG", "False").lower() == "true"
+
+    # Idempotency-Key support for the chat endpoints
+    idempotency_ttl_seconds: float = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+    idempotency_max_keys: int = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+
+    # Request deadlines; X-Request-Timeout may only shorten the budget
+    request_timeout_seconds: float = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "120"))
+
+    # Admission control per route class; excess requests get a 503
+    admission_chat_concurrency: int = int(os.getenv("ADMISSION_CHAT_CONCURRENCY", "16"))
+    admission_chat_queue: int = int(os.getenv("ADMISSION_CHAT_QUEUE", "64"))
+    admission_agent_concurrency: int = int(os.getenv("ADMISSION_AGENT_CONCURRENCY", "4"))
+    admission_agent_queue: int = int(os.getenv("ADMISSION_AGENT_QUEUE", "16"))
+    admission_topic_concurrency: int = int(os.getenv("ADMISSION_TOPIC_CONCURRENCY", "8"))
+    admission_topic_queue: int = int(os.getenv("ADMISSION_TOPIC_QUEUE", "32"))
+    admission_max_queue_seconds: float = float(os.getenv("ADMISSION_MAX_QUEUE_SECONDS", "10"))
+
+    # Request tracing; 0 disables sampling. /debug/traces and forcing a
+    # trace with X-Trace: 1 are only enabled with DEBUG_TRACES (default: DEBUG)
+    trace_sample_rate: float = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+    trace_buffer_size: int = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+    debug_traces: bool = os.getenv("DEBUG_TRACES", os.getenv("DEBUG", "False")).lower() == "true"
+
+    # POST /topic/identify upload limits
+    topic_max_upload_bytes: int = int(os.getenv("TOPIC_MAX_UPLOAD_BYTES", str(12 * 1024 * 1024)))
+    topic_spool_bytes: int = int(os.getenv("TOPIC_SPOOL_BYTES", str(1024 * 1024)))
+    topic_max_pixels: int = int(os.getenv("TOPIC_MAX_PIXELS", "50000000"))
+    topic_max_text_chars: int = int(os.getenv("TOPIC_MAX_TEXT_CHARS", "2000"))
+
+    # Record/replay of upstream HTTP calls: off, record or replay
+    cassette_mode: str = os.getenv("CASSETTE_MODE", "off")
+    cassette_dir: str = os.getenv("CASSETTE_DIR", "cassettes")
+    cassette_timing: str = os.getenv("CASSETTE_TIMING", "recorded")
+
+    # Cached product descriptions/summaries and the refresh-ahead warmer
+    product_cache_ttl_seconds: float = float(os.getenv("PRODUCT_CACHE_TTL_SECONDS", str(6 * 3600)))
+    product_cache_max_entries: int = int(os.getenv("PRODUCT_CACHE_MAX_ENTRIES", "5000"))
+    warmer_top_k: int = int(os.getenv("WARMER_TOP_K", "300"))
+    warmer_min_requests: int = int(os.getenv("WARMER_MIN_REQUESTS", "3"))
+    warmer_refresh_ahead_seconds: float = float(os.getenv("WARMER_REFRESH_AHEAD_SECONDS", "900"))
+    warmer_interval_seconds: float = float(os.getenv("WARMER_INTERVAL_SECONDS", "30"))
+    warmer_max_refreshes_per_minute: float = float(os.getenv("WARMER_MAX_REFRESHES_PER_MINUTE", "10"))
+    warmer_preload_file: str = os.getenv("WARMER_PRELOAD_FILE", "")
+
+settings = Settings()
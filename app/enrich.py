@@ -0,0 +1,437 @@
+"""Resumable offline catalog enrichment.
+
+Streams a JSONL or CSV catalog through three stages and writes one JSONL
+result per listing:
+
+1. identify: ``ProductClassifierAgent`` maps the listing to ``brand-model``
+2. describe: ``OpenAIService.create_web_search_response`` for each product
+3. summarize: ``SummarizeAgent`` over the description
+
+Listings that map to the same ``brand-model`` share one describe/summarize
+run. Progress is journaled to a state file, so an interrupted run picks up
+where it left off when started again with the same arguments.
+
+Usage:
+    python -m app.enrich catalog.jsonl -o enriched.jsonl
+"""
+
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from pathlib import Path
+import argparse
+import csv
+import json
+import queue
+import sys
+import threading
+import time
+
+from app.services.deadline import Deadline
+from app.services.openai_service import OpenAIService, extract_output_text
+from app.services.prompts import prompts
+from SummarizeAgent.agents import SummarizeAgent
+from TopicAgent.ProductTopic import ProductClassifierAgent
+
+_DONE = object()
+
+
+def read_items(
+    path: Path,
+    fmt: Optional[str] = None,
+    on_error: Optional[Callable[[int, Exception], None]] = None,
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield numbered catalog rows one at a time from a JSONL or CSV file.
+
+    Rows are numbered from 1, counting malformed JSONL lines too, so row
+    numbers (used as fallback ids) stay stable when a bad line is skipped.
+
+    Args:
+        path: The input file.
+        fmt: ``jsonl`` or ``csv``; guessed from the suffix when omitted.
+        on_error: Called with the row number and error of each JSONL line
+            that is not a JSON object; such lines are skipped.
+    """
+    fmt = fmt or ("csv" if path.suffix.lower() == ".csv" else "jsonl")
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            yield from enumerate(csv.DictReader(f), start=1)
+            return
+        row_no = 0
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            row_no += 1
+            try:
+                item = json.loads(line)
+                if not isinstance(item, dict):
+                    raise ValueError(f"expected a JSON object, got {type(item).__name__}")
+            except ValueError as e:
+                if on_error is not None:
+                    on_error(row_no, e)
+                continue
+            yield row_no, item
+
+
+class EnrichState:
+    """Append-only journal of finished listings and products.
+
+    Each line is either ``{"done": <item id>}`` or
+    ``{"product": <brand-model>, "description": ..., "summary": ...}``.
+    Appending keeps checkpoints O(1) however large the catalog is. Only
+    product keys and the journal offsets of their lines are kept in memory;
+    descriptions and summaries are read back from the journal when reused.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.done: Set[str] = set()
+        self.products: Dict[str, int] = {}
+        valid_end = 0
+        if path.exists():
+            with open(path, "rb") as f:
+                offset = 0
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a crash; everything before it is valid
+                        break
+                    if "done" in entry:
+                        self.done.add(entry["done"])
+                    elif "product" in entry:
+                        self.products[entry["product"]] = offset
+                    offset += len(line)
+                    valid_end = offset
+        self._file = open(path, "ab")
+        # Drop a torn tail so new entries don't get appended to it. The
+        # append-mode position is not moved by truncate, so offsets are
+        # tracked here rather than taken from tell().
+        self._file.truncate(valid_end)
+        self._offset = valid_end
+        self._reader = open(path, "rb")
+        self._read_lock = threading.Lock()
+
+    def has_product(self, key: str) -> bool:
+        return key in self.products
+
+    def product(self, key: str) -> Tuple[str, str]:
+        """Read a recorded product's (description, summary) from the journal."""
+        with self._read_lock:
+            self._reader.seek(self.products[key])
+            entry = json.loads(self._reader.readline())
+        return entry["description"], entry["summary"]
+
+    def record_product(self, key: str, description: str, summary: str) -> None:
+        offset = self._write({"product": key, "description": description, "summary": summary})
+        self.products[key] = offset
+
+    def record_done(self, item_id: str) -> None:
+        self.done.add(item_id)
+        self._write({"done": item_id})
+
+    def _write(self, entry: Dict[str, Any]) -> int:
+        data = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        offset = self._offset
+        self._file.write(data)
+        self._file.flush()
+        self._offset += len(data)
+        return offset
+
+    def close(self) -> None:
+        self._file.close()
+        self._reader.close()
+
+
+class Progress:
+    """Prints throughput and ETA to stderr at a fixed interval."""
+
+    def __init__(self, total: Optional[int], interval: float = 5.0):
+        self.total = total
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.written = 0
+        self.failed = 0
+        self.deduped = 0
+
+    def maybe_report(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self.last_report < self.interval:
+            return
+        self.last_report = now
+        elapsed = max(now - self.started, 1e-9)
+        rate = self.written / elapsed
+        line = f"[enrich] {self.written}"
+        if self.total is not None:
+            line += f"/{self.total}"
+        line += f" items ({self.failed} failed, {self.deduped} deduped) {rate:.2f} items/s"
+        if self.total is not None and rate > 0:
+            eta = int((self.total - self.written - self.failed) / rate)
+            line += f" ETA {eta // 3600}h{eta % 3600 // 60:02d}m{eta % 60:02d}s"
+        print(line, file=sys.stderr, flush=True)
+
+
+class CatalogEnricher:
+    """Bounded-concurrency identify → describe → summarize pipeline.
+
+    Each stage has its own worker threads fed by a bounded queue, so a slow
+    stage applies backpressure all the way to the file reader and memory
+    stays flat regardless of catalog size.
+    """
+
+    def __init__(
+        self,
+        state: EnrichState,
+        output_path: Path,
+        id_field: str = "id",
+        text_field: str = "title",
+        image_field: str = "image",
+        identify_workers: int = 8,
+        describe_workers: int = 4,
+        summarize_workers: int = 2,
+        timeout: Optional[float] = None,
+        progress: Optional[Progress] = None,
+    ):
+        self.state = state
+        self.output_path = output_path
+        self.id_field = id_field
+        self.text_field = text_field
+        self.image_field = image_field
+        self.workers = {
+            "identify": identify_workers,
+            "describe": describe_workers,
+            "summarize": summarize_workers,
+        }
+        self.timeout = timeout
+        self.progress = progress or Progress(None)
+
+        self.queues = {stage: queue.Queue(maxsize=2 * n) for stage, n in self.workers.items()}
+        self.results: "queue.Queue[Any]" = queue.Queue()
+        # brand-model -> listings waiting for its describe/summarize run
+        self._pending: Dict[str, List[Tuple[str, Dict[str, Any]]]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._classifier = ProductClassifierAgent()
+
+    def _item_id(self, item: Dict[str, Any], line_no: int) -> str:
+        return str(item.get(self.id_field) or line_no)
+
+    # Stages
+
+    def _read(self, items: Iterator[Tuple[int, Dict[str, Any]]]) -> None:
+        for line_no, item in items:
+            if self._stop.is_set():
+                break
+            item_id = self._item_id(item, line_no)
+            if item_id in self.state.done:
+                continue
+            self.queues["identify"].put((item_id, item))
+
+    def _identify(self, job: Tuple[str, Dict[str, Any]]) -> None:
+        item_id, item = job
+        image = item.get(self.image_field)
+        inp = Path(image) if image else str(item.get(self.text_field, ""))
+        key = self._classifier.run(inp, timeout=self.timeout)
+        if key is None:
+            self.results.put(("rows", [(item_id, item, None, None, None)]))
+            return
+        with self._lock:
+            known = self.state.has_product(key)
+            if not known:
+                waiting = self._pending.get(key)
+                if waiting is not None:
+                    waiting.append((item_id, item))
+                    self.progress.deduped += 1
+                    return
+                self._pending[key] = [(item_id, item)]
+        if known:
+            with self._lock:
+                self.progress.deduped += 1
+            self.results.put(("rows", [(item_id, item, key, *self.state.product(key))]))
+            return
+        self.queues["describe"].put(key)
+
+    def _describe(self, key: str) -> None:
+        response = OpenAIService().create_web_search_response(
+            input_text=key,
+            deadline=Deadline(self.timeout) if self.timeout else None,
+        )
+        self.queues["summarize"].put((key, extract_output_text(response)))
+
+    def _summarize(self, job: Tuple[str, str]) -> None:
+        key, description = job
+        summary = SummarizeAgent(description, timeout=self.timeout).run()
+        self.results.put(("product", key, description, summary))
+
+    def _fail(self, stage: str, job: Any, error: Exception) -> None:
+        if stage == "identify":
+            item_id, _ = job
+            self.results.put(("failed", [item_id], error))
+            return
+        key = job if stage == "describe" else job[0]
+        with self._lock:
+            waiting = self._pending.pop(key, [])
+        self.results.put(("failed", [item_id for item_id, _ in waiting], error))
+
+    def _worker(self, stage: str, handler: Any) -> None:
+        inbox = self.queues[stage]
+        while True:
+            job = inbox.get()
+            if job is _DONE:
+                return
+            try:
+                handler(job)
+            except Exception as e:
+                self._fail(stage, job, e)
+
+    def _start_stage(self, stage: str, handler: Any, downstream: Optional[str]) -> None:
+        threads = [
+            threading.Thread(target=self._worker, args=(stage, handler), daemon=True)
+            for _ in range(self.workers[stage])
+        ]
+        for thread in threads:
+            thread.start()
+
+        def close() -> None:
+            for thread in threads:
+                thread.join()
+            if downstream is None:
+                self.results.put(_DONE)
+                return
+            for _ in range(self.workers[downstream]):
+                self.queues[downstream].put(_DONE)
+
+        threading.Thread(target=close, daemon=True).start()
+
+    # Driver
+
+    def reject_row(self, row_no: int, error: Exception) -> None:
+        """Report an unreadable input row as a failed item (``read_items`` on_error)."""
+        self.results.put(("failed", [f"row {row_no}"], error))
+
+    def run(self, items: Iterator[Tuple[int, Dict[str, Any]]]) -> None:
+        """Enrich ``items``, appending results to the output file as they finish.
+
+        Raises:
+            Exception: Whatever stopped the input from being read, once the
+                items read before it have been processed.
+        """
+        feed_error: List[BaseException] = []
+        self._start_stage("identify", self._identify, "describe")
+        self._start_stage("describe", self._describe, "summarize")
+        self._start_stage("summarize", self._summarize, None)
+
+        def feed() -> None:
+            try:
+                self._read(items)
+            except BaseException as e:
+                feed_error.append(e)
+            finally:
+                for _ in range(self.workers["identify"]):
+                    self.queues["identify"].put(_DONE)
+
+        threading.Thread(target=feed, daemon=True).start()
+
+        with open(self.output_path, "a", encoding="utf-8") as out:
+            try:
+                while True:
+                    try:
+                        message = self.results.get(timeout=self.progress.interval)
+                    except queue.Empty:
+                        self.progress.maybe_report()
+                        continue
+                    if message is _DONE:
+                        break
+                    self._handle(message, out)
+                    self.progress.maybe_report()
+            finally:
+                self._stop.set()
+                self.progress.maybe_report(force=True)
+        if feed_error:
+            raise feed_error[0]
+
+    def _handle(self, message: Tuple[Any, ...], out: Any) -> None:
+        kind = message[0]
+        if kind == "product":
+            _, key, description, summary = message
+            self.state.record_product(key, description, summary)
+            with self._lock:
+                waiting = self._pending.pop(key, [])
+            rows = [(item_id, item, key, description, summary) for item_id, item in waiting]
+        elif kind == "rows":
+            rows = message[1]
+        else:
+            _, item_ids, error = message
+            self.progress.failed += len(item_ids)
+            print(f"[enrich] failed {len(item_ids)} item(s): {type(error).__name__}: {error}", file=sys.stderr)
+            return
+
+        for item_id, item, key, description, summary in rows:
+            out.write(json.dumps({
+                "id": item_id,
+                "input": item,
+                "brand_model": key,
+                "description": description,
+                "summary": summary,
+            }, ensure_ascii=False) + "\n")
+        out.flush()
+        # Journal only after the rows are on disk; a crash in between
+        # re-emits these rows on resume rather than losing them
+        for item_id, *_ in rows:
+            self.state.record_done(item_id)
+        self.progress.written += len(rows)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Enrich a product catalog offline.")
+    parser.add_argument("input", type=Path, help="JSONL or CSV catalog")
+    parser.add_argument("-o", "--output", type=Path, required=True, help="JSONL file results are appended to")
+    parser.add_argument("--state", type=Path, help="Checkpoint file (default: <output>.state)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Input format (default: from suffix)")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--text-field", default="title")
+    parser.add_argument("--image-field", default="image")
+    parser.add_argument("--identify-workers", type=int, default=8)
+    parser.add_argument("--describe-workers", type=int, default=4)
+    parser.add_argument("--summarize-workers", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds per upstream call")
+    parser.add_argument("--no-count", action="store_true", help="Skip the counting pass (no ETA)")
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    state = EnrichState(args.state or args.output.with_name(args.output.name + ".state"))
+    total = None
+    if not args.no_count:
+        bad_rows: List[int] = []
+        rows = sum(1 for _ in read_items(args.input, args.format, on_error=lambda row_no, e: bad_rows.append(row_no)))
+        total = rows + len(bad_rows) - len(state.done)
+    enricher = CatalogEnricher(
+        state=state,
+        output_path=args.output,
+        id_field=args.id_field,
+        text_field=args.text_field,
+        image_field=args.image_field,
+        identify_workers=args.identify_workers,
+        describe_workers=args.describe_workers,
+        summarize_workers=args.summarize_workers,
+        timeout=args.timeout,
+        progress=Progress(total, args.report_interval),
+    )
+    try:
+        enricher.run(read_items(args.input, args.format, on_error=enricher.reject_row))
+    except KeyboardInterrupt:
+        print("\n[enrich] interrupted; rerun the same command to resume", file=sys.stderr)
+        return 130
+    except Exception as e:
+        print(f"[enrich] stopped reading {args.input}: {type(e).__name__}: {e}", file=sys.stderr)
+        return 1
+    finally:
+        state.close()
+        report = prompts.format_report()
+        if report:
+            print(f"[enrich] prompt cache:\n{report}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
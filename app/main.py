@@ -1,24 +1,30 @@
 """Main FastAPI application."""
 
-from fastapi import FastAPI, Depends
+from contextlib import asynccontextmanager
+from pathlib import Path
+from fastapi import FastAPI, Depends, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic_settings import BaseSettings
 from pydantic import BaseModel
-from typing import List
-from dotenv import load_dotenv
-import os
+from typing import List, Optional
 
+from app.config import settings
 from app.services import OpenAIService
-from app.api import browsing_agent
-
-# Load environment variables
-load_dotenv()
-
-class Settings(BaseSettings):
-    """Application settings."""
-    api_host: str = os.getenv("API_HOST", "0.0.0.0")
-    api_port: int = int(os.getenv("API_PORT", "8000"))
-    debug: bool = os.getenv("DEBUG", "False").lower() == "true"
+from app.services.admission import AdmissionController, AdmissionMiddleware
+from app.services.tracing import TracingMiddleware
+from app.services.prompts import prompts
+from app.services.warmer import read_product_list
+from app.services.deadline import (
+    Deadline,
+    DeadlineExceeded,
+    parse_timeout_header,
+    run_with_deadline,
+)
+from app.services.idempotency import (
+    IdempotencyKeyConflict,
+    IdempotencyStore,
+    request_fingerprint,
+)
+from app.api import browsing_agent, debug, topic
 
 class Message(BaseModel):
     """Message model for chat."""
@@ -29,15 +35,63 @@ class ChatRequest(BaseModel):
     """Chat request model."""
     messages: List[Message]
 
-settings = Settings()
+idempotency_store = IdempotencyStore(
+    ttl_seconds=settings.idempotency_ttl_seconds,
+    max_entries=settings.idempotency_max_keys,
+)
+
+admission = AdmissionController()
+admission.add_class(
+    "chat",
+    concurrency=settings.admission_chat_concurrency,
+    max_queue=settings.admission_chat_queue,
+    max_queue_seconds=settings.admission_max_queue_seconds,
+)
+admission.add_class(
+    "agent",
+    concurrency=settings.admission_agent_concurrency,
+    max_queue=settings.admission_agent_queue,
+    max_queue_seconds=settings.admission_max_queue_seconds,
+)
+admission.add_class(
+    "topic",
+    concurrency=settings.admission_topic_concurrency,
+    max_queue=settings.admission_topic_queue,
+    max_queue_seconds=settings.admission_max_queue_seconds,
+)
+admission.add_route("POST", "/chat", "chat")
+admission.add_route("POST", "/agent/chat", "agent")
+admission.add_route("POST", "/topic/identify", "topic")
+admission.add_route("POST", "/topic/describe", "topic")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the product cache warmer for the lifetime of the app."""
+    # Refreshes pause while live requests are queueing for admission
+    topic.warmer.is_busy = admission.busy
+    if settings.warmer_preload_file:
+        topic.warmer.preload(read_product_list(Path(settings.warmer_preload_file)))
+    topic.warmer.start()
+    try:
+        yield
+    finally:
+        await topic.warmer.stop()
 
 app = FastAPI(
     title="GenCommAI API",
     description="API for GenCommAI agents and services",
     version="1.0.0",
     debug=settings.debug,
+    lifespan=lifespan,
 )
 
+# Admission control for LLM-backed routes; added before CORS so shed
+# responses still carry CORS headers
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
+# Trace sampled requests, including time spent queued for admission
+app.add_middleware(TracingMiddleware, tracer=debug.tracer, allow_force=settings.debug_traces)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -54,6 +108,10 @@ def get_openai_service() -> OpenAIService:
 
 # Include routers
 app.include_router(browsing_agent.router)
+app.include_router(topic.router)
+if settings.debug_traces:
+    # Traces expose other requests' data; never mount this unauthenticated in production
+    app.include_router(debug.router)
 
 @app.get("/")
 async def root():
@@ -69,17 +127,65 @@ async def health_check():
     """Health check endpoint."""
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def metrics():
+    """Admission load, prompt-cache hit ratios and product cache/warmer stats."""
+    return {
+        "admission": admission.stats(),
+        "prompts": prompts.report(),
+        "product_cache": topic.product_cache.stats(),
+        "warmer": topic.warmer.stats(),
+    }
+
 # Example endpoint using OpenAI service
 @app.post("/chat")
 async def chat(
     request: ChatRequest,
+    http_request: Request,
+    response: Response,
     openai_service: OpenAIService = Depends(get_openai_service),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    request_timeout: Optional[str] = Header(None, alias="X-Request-Timeout"),
 ):
-    """Chat endpoint using OpenAI."""
+    """Chat endpoint using OpenAI.
+
+    Retries carrying the same ``Idempotency-Key`` header attach to the request
+    still in flight or replay its stored response. The upstream call is bounded
+    by ``X-Request-Timeout`` (capped by config) and abandoned when the client
+    disconnects.
+    """
     # Convert Pydantic models to dictionaries
     messages = [msg.model_dump() for msg in request.messages]
-    response = openai_service.create_chat_completion(messages)
-    return response
+    deadline = Deadline(parse_timeout_header(
+        request_timeout,
+        default=settings.request_timeout_seconds,
+        maximum=settings.request_timeout_seconds,
+    ))
+
+    async def compute():
+        return await run_with_deadline(
+            deadline,
+            openai_service.create_chat_completion,
+            messages,
+            request=None if idempotency_key else http_request,
+            deadline=deadline,
+        )
+
+    try:
+        if not idempotency_key:
+            return await compute()
+        result, replayed = await idempotency_store.run(
+            key=f"chat:{idempotency_key}",
+            fingerprint=request_fingerprint(request.model_dump()),
+            compute=compute,
+        )
+    except IdempotencyKeyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail={"error": "timeout", "message": str(e)})
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
 
 if __name__ == "__main__":
     import uvicorn
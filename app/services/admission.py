@@ -0,0 +1,197 @@
+"""Admission control and load shedding for LLM-backed routes."""
+
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+import asyncio
+import json
+import math
+import time
+
+
+class RouteClass:
+    """Concurrency limit with a bounded, time-limited wait queue.
+
+    Requests beyond ``concurrency`` wait in FIFO order; when the queue is full
+    or a request has waited ``max_queue_seconds``, it is shed instead.
+    """
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, max_queue_seconds: float):
+        """Initialize the route class.
+
+        Args:
+            name: Name used in metrics.
+            concurrency: Maximum number of requests running at once.
+            max_queue: Maximum number of requests waiting for a slot.
+            max_queue_seconds: Maximum time a request may wait for a slot.
+        """
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_queue_seconds = max_queue_seconds
+        self.active = 0
+        self._waiters: Deque["asyncio.Future[None]"] = deque()
+        self._service_time: Optional[float] = None
+
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_queue_timeout = 0
+        self.max_queue_depth = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        """Wait for a slot.
+
+        Returns:
+            True if the request was admitted, False if it should be shed.
+        """
+        if self.active < self.concurrency and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self.shed_queue_full += 1
+            return False
+
+        waiter: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        try:
+            await asyncio.wait({waiter}, timeout=self.max_queue_seconds)
+        except BaseException:
+            if waiter.done():
+                # A slot was handed over just as we were cancelled; pass it on
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            raise
+        if not waiter.done():
+            # Waited too long; give up the place in line
+            waiter.cancel()
+            self._waiters.remove(waiter)
+            self.shed_queue_timeout += 1
+            return False
+        # release() handed its slot over without decrementing ``active``
+        self.admitted += 1
+        return True
+
+    def release(self, service_time: Optional[float] = None) -> None:
+        """Free a slot, handing it to the oldest waiter if there is one.
+
+        Args:
+            service_time: How long the request held the slot, for Retry-After.
+        """
+        if service_time is not None:
+            if self._service_time is None:
+                self._service_time = service_time
+            else:
+                self._service_time = 0.8 * self._service_time + 0.2 * service_time
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def retry_after(self) -> int:
+        """Seconds a shed client should wait before retrying."""
+        if self._service_time is None:
+            return max(1, math.ceil(self.max_queue_seconds))
+        backlog = (len(self._waiters) + self.active) / max(self.concurrency, 1)
+        return max(1, math.ceil(self._service_time * backlog))
+
+    def stats(self) -> Dict[str, Any]:
+        """Current load and counters for this route class."""
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "queue_depth": len(self._waiters),
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_queue_timeout": self.shed_queue_timeout,
+            "avg_service_seconds": self._service_time,
+        }
+
+
+class AdmissionController:
+    """Maps routes to route classes; unmapped routes are always admitted."""
+
+    def __init__(self):
+        self.classes: Dict[str, RouteClass] = {}
+        self.routes: Dict[Tuple[str, str], RouteClass] = {}
+
+    def add_class(
+        self,
+        name: str,
+        concurrency: int,
+        max_queue: int,
+        max_queue_seconds: float,
+    ) -> RouteClass:
+        """Create a route class with its own limit and queue."""
+        route_class = RouteClass(name, concurrency, max_queue, max_queue_seconds)
+        self.classes[name] = route_class
+        return route_class
+
+    def add_route(self, method: str, path: str, class_name: str) -> None:
+        """Put ``method path`` under admission control of ``class_name``."""
+        self.routes[(method.upper(), path)] = self.classes[class_name]
+
+    def classify(self, method: str, path: str) -> Optional[RouteClass]:
+        """Return the route class for a request, or None if it bypasses control."""
+        return self.routes.get((method.upper(), path.rstrip("/") or "/"))
+
+    def busy(self) -> bool:
+        """True when any route class has requests waiting for a slot."""
+        return any(route_class.queue_depth > 0 for route_class in self.classes.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Stats for every route class, for the metrics endpoint."""
+        return {name: route_class.stats() for name, route_class in self.classes.items()}
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that admits, queues or sheds requests before routing."""
+
+    def __init__(self, app: Any, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route_class = self.controller.classify(scope["method"], scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await route_class.acquire():
+            await self._reject(route_class, send)
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route_class.release(time.monotonic() - started)
+
+    @staticmethod
+    async def _reject(route_class: RouteClass, send: Any) -> None:
+        body = json.dumps({
+            "detail": f"Server is overloaded ({route_class.name}); retry later",
+        }).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(route_class.retry_after()).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,8 +1,12 @@
 """Base agent implementation with tool support."""
 
 from typing import List, Dict, Any, Optional
+import threading
 from app.services.openai_service import OpenAIService
+from app.services.deadline import Deadline, DeadlineExceeded, current_deadline
+from app.services.tracing import span
 from app.services.tool import Tool
+from app.services.prompts import prompts
 
 class Agent:
     """Agent that can use tools in conversations with OpenAI."""
@@ -14,6 +18,7 @@ class Agent:
         max_tokens: Optional[int] = None,
         system_message: str = "You are a helpful AI assistant that can use tools to help users.",
         tools: Optional[List[Tool]] = None,
+        prompt: Optional[str] = None,
     ):
         """Initialize the agent.
         
@@ -23,16 +28,21 @@ class Agent:
             max_tokens: Maximum tokens for completions.
             system_message: The system message to use for the agent's personality.
             tools: Optional list of tools to register on initialization.
+            prompt: Optional name of a registered prompt to use as the system
+                message instead of ``system_message``; its cache usage is recorded.
         """
         self.service = OpenAIService(
             model=model,
             temperature=temperature,
             max_tokens=max_tokens,
         )
-        self.system_message = system_message
+        self.prompt = prompt
+        self.system_message = prompts.text(prompt) if prompt else system_message
         self.conversation_history: List[Dict[str, str]] = [
-            {"role": "system", "content": system_message}
+            {"role": "system", "content": self.system_message}
         ]
+        # Chats run in a worker thread; keep turns from interleaving in history
+        self._lock = threading.RLock()
         
         # Register any tools provided during initialization
         if tools:
@@ -45,23 +55,16 @@ class Agent:
         Args:
             tool: A Tool instance containing the tool definition.
         """
-        tool_dict = tool.to_dict()
-        if tool.type == "function" and tool.function is not None:
-            # Register the function with the service
-            self.service.register_function(
-                name=tool.name,  # Use the explicit name from the tool
-                function=tool.function,
-                description=tool.description or "",
-                parameters=tool.parameters or {},
-            )
-        # Add the tool definition to the service
-        self.service.tool_definitions.append(tool_dict)
+        # The service's registry stores each tool once, keyed by name
+        self.service.register_tool(tool)
 
     def chat(
         self,
         message: str,
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
+        tools: Optional[List[str]] = None,
     ) -> str:
         """Have a conversation with the agent.
         
@@ -69,31 +72,65 @@ class Agent:
             message: The user's message.
             temperature: Optional override for temperature.
             max_tokens: Optional override for max tokens.
+            deadline: Optional request deadline for the whole tool loop.
+            tools: Optional names of the registered tools to offer; all by default.
             
         Returns:
             The agent's response.
+
+        Raises:
+            DeadlineExceeded: If the deadline passes, including while waiting
+                for another turn of the conversation to finish.
         """
-        # Add user message to conversation history
-        self.conversation_history.append({"role": "user", "content": message})
-        
-        # Get response from OpenAI
-        response = self.service.create_chat_completion_with_tools(
-            messages=self.conversation_history,
-            temperature=temperature,
-            max_tokens=max_tokens,
-        )
-        
-        # Extract assistant's message
-        assistant_message = response["choices"][0]["message"]
-        
-        # Add assistant's message to conversation history
-        self.conversation_history.append(assistant_message)
-        
-        # Return the content of the assistant's message
-        return assistant_message.get("content", "")
+        if deadline is None:
+            deadline = current_deadline.get()
+        wait = deadline.remaining() if deadline is not None else None
+        if not self._lock.acquire(timeout=-1 if wait is None else wait):
+            raise DeadlineExceeded("Agent chat exceeded the request deadline waiting for the previous turn")
+        try:
+            return self._chat(message, temperature, max_tokens, deadline, tools)
+        finally:
+            self._lock.release()
+
+    def _chat(
+        self,
+        message: str,
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        deadline: Optional[Deadline],
+        tools: Optional[List[str]],
+    ) -> str:
+        with span("agent.chat", model=self.service.config.model):
+            # Add user message to conversation history
+            self.conversation_history.append({"role": "user", "content": message})
+            
+            # Get response from OpenAI
+            try:
+                response = self.service.create_chat_completion_with_tools(
+                    messages=self.conversation_history,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    deadline=deadline,
+                    tools=tools,
+                    prompt=self.prompt,
+                )
+            except Exception:
+                # Drop the unanswered turn so a retry doesn't repeat it
+                self.conversation_history.pop()
+                raise
+            
+            # Extract assistant's message
+            assistant_message = response["choices"][0]["message"]
+            
+            # Add assistant's message to conversation history
+            self.conversation_history.append(assistant_message)
+            
+            # Return the content of the assistant's message
+            return assistant_message.get("content", "")
 
     def reset_conversation(self) -> None:
         """Reset the conversation history while keeping the system message."""
-        self.conversation_history = [
-            {"role": "system", "content": self.system_message}
-        ]
\ No newline at end of file
+        with self._lock:
+            self.conversation_history = [
+                {"role": "system", "content": self.system_message}
+            ]
\ No newline at end of file
@@ -0,0 +1,226 @@
+"""Transport-level record/replay of upstream HTTP calls.
+
+With ``CASSETTE_MODE=record`` every request made through ``http_client()`` is
+forwarded upstream and the raw response (status, headers, body chunks and
+their timing) is saved to a gzipped cassette file named after a canonical
+hash of the request. With ``CASSETTE_MODE=replay`` the same requests are
+served from those files without network access or credentials, either at
+the recorded pace (``CASSETTE_TIMING=recorded``) or as fast as possible
+(``CASSETTE_TIMING=fast``).
+
+The OpenAI clients in ``OpenAIService`` and ``ProductClassifierAgent`` and
+the autogen personas of ``SummarizeAgent`` all use ``http_client()``, so a
+hot-path change can be profiled against byte-identical upstream behavior.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+import base64
+import gzip
+import hashlib
+import json
+import threading
+import time
+
+import httpx
+
+from app.config import settings
+
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode when no recording matches a request."""
+
+
+# Response headers that differ per call and carry no behavior
+_DROPPED_HEADERS = {"date", "set-cookie", "x-request-id", "openai-processing-ms", "cf-ray"}
+
+
+def request_key(request: httpx.Request) -> str:
+    """Canonical hash of a request: method, path and JSON body.
+
+    The host is left out so cassettes work against any base URL, and JSON
+    bodies are re-serialized with sorted keys so field order does not matter.
+    """
+    body = request.content
+    try:
+        body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")).encode("utf-8")
+    except ValueError:
+        pass
+    digest = hashlib.sha256()
+    digest.update(request.method.encode("ascii"))
+    digest.update(b" ")
+    digest.update(request.url.raw_path)
+    digest.update(b"\n")
+    digest.update(body)
+    return digest.hexdigest()
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    """Passes upstream chunks through while recording them and their timing."""
+
+    def __init__(self, stream: httpx.SyncByteStream, interaction: Dict[str, Any], started: float, on_close: Any):
+        self._stream = stream
+        self._interaction = interaction
+        self._started = started
+        self._on_close = on_close
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._stream:
+            self._interaction["chunks"].append(
+                [round(time.monotonic() - self._started, 4), base64.b64encode(chunk).decode("ascii")]
+            )
+            yield chunk
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._on_close(self._interaction)
+
+
+class _ReplayStream(httpx.SyncByteStream):
+    """Yields recorded chunks, optionally at their recorded offsets."""
+
+    def __init__(self, chunks: List[List[Any]], started: float, realtime: bool):
+        self._chunks = chunks
+        self._started = started
+        self._realtime = realtime
+
+    def __iter__(self) -> Iterator[bytes]:
+        for offset, data in self._chunks:
+            if self._realtime:
+                delay = self._started + offset - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            yield base64.b64decode(data)
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """httpx transport that records to or replays from a cassette directory."""
+
+    def __init__(self, directory: Path, mode: str, realtime: bool = True, upstream: Optional[httpx.BaseTransport] = None):
+        """Initialize the transport.
+
+        Args:
+            directory: Where cassette files are read and written.
+            mode: ``record`` or ``replay``.
+            realtime: In replay mode, reproduce recorded latencies.
+            upstream: Transport used in record mode (defaults to HTTP).
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode {mode!r}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.mode = mode
+        self.realtime = realtime
+        self.upstream = upstream or httpx.HTTPTransport()
+        self._lock = threading.Lock()
+        self._recorded: Set[str] = set()
+        self._replay_index: Dict[str, int] = {}
+        self._loaded: Dict[str, List[Dict[str, Any]]] = {}
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json.gz"
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        key = request_key(request)
+        if self.mode == "replay":
+            return self._replay(key, request)
+        return self._record(key, request)
+
+    def _record(self, key: str, request: httpx.Request) -> httpx.Response:
+        started = time.monotonic()
+        response = self.upstream.handle_request(request)
+        interaction = {
+            "method": request.method,
+            "path": request.url.path,
+            "status": response.status_code,
+            "headers": [
+                [k, v] for k, v in response.headers.multi_items() if k.lower() not in _DROPPED_HEADERS
+            ],
+            "headers_at": round(time.monotonic() - started, 4),
+            "chunks": [],
+        }
+
+        def save(finished: Dict[str, Any]) -> None:
+            with self._lock:
+                # A fresh recording replaces old cassettes; repeats in one run append
+                interactions = self._read(key) if key in self._recorded else []
+                interactions.append(finished)
+                self._recorded.add(key)
+                with gzip.open(self._path(key), "wt", encoding="utf-8") as f:
+                    json.dump(interactions, f, separators=(",", ":"))
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(response.stream, interaction, started, save),
+            extensions=response.extensions,
+        )
+
+    def _read(self, key: str) -> List[Dict[str, Any]]:
+        path = self._path(key)
+        if not path.exists():
+            return []
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _replay(self, key: str, request: httpx.Request) -> httpx.Response:
+        started = time.monotonic()
+        with self._lock:
+            interactions = self._loaded.get(key)
+            if interactions is None:
+                interactions = self._loaded[key] = self._read(key)
+            if not interactions:
+                raise CassetteMissError(f"No recording for {request.method} {request.url.path} ({key})")
+            # Repeated identical requests replay in recorded order; the last one repeats
+            index = self._replay_index.get(key, 0)
+            self._replay_index[key] = index + 1
+            interaction = interactions[min(index, len(interactions) - 1)]
+
+        if self.realtime:
+            delay = started + interaction["headers_at"] - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return httpx.Response(
+            status_code=interaction["status"],
+            headers=interaction["headers"],
+            stream=_ReplayStream(interaction["chunks"], started, self.realtime),
+            request=request,
+        )
+
+    def close(self) -> None:
+        self.upstream.close()
+
+
+class _SharedClient(httpx.Client):
+    """An httpx client that survives the deep copies autogen makes of llm_config."""
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> "_SharedClient":
+        return self
+
+
+_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+
+
+def http_client() -> Optional[httpx.Client]:
+    """The process-wide recording/replaying HTTP client, or None when off.
+
+    Passing None to the OpenAI client keeps its default transport, so call
+    sites can use ``http_client=http_client()`` unconditionally.
+    """
+    global _client
+    if settings.cassette_mode == "off":
+        return None
+    with _client_lock:
+        if _client is None:
+            transport = CassetteTransport(
+                directory=Path(settings.cassette_dir),
+                mode=settings.cassette_mode,
+                realtime=settings.cassette_timing == "recorded",
+            )
+            # Same default timeout as the OpenAI client
+            _client = _SharedClient(transport=transport, timeout=httpx.Timeout(600.0, connect=5.0))
+        return _client
@@ -0,0 +1,199 @@
+"""Request-scoped deadlines and cancellation."""
+
+from contextvars import ContextVar, copy_context
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import functools
+import threading
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request runs out of time or its client goes away."""
+
+
+class Deadline:
+    """Time budget for one request, shared by every step working on it.
+
+    The budget is checked between model calls and tool executions, and the
+    remaining time is passed as the timeout of each upstream call, so work
+    stops as soon as nobody is waiting for its result.
+
+    Cancellation is cooperative: it is observed before the next model call or
+    tool execution. An upstream call already in flight keeps running until it
+    returns or hits its timeout, because the HTTP client is shared and cannot
+    abort one request without closing the others.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        """Initialize the deadline.
+
+        Args:
+            timeout: Seconds from now until the deadline, or None for no limit.
+        """
+        self.timeout = timeout
+        self.expires_at = None if timeout is None else time.monotonic() + timeout
+        self.reason: Optional[str] = None
+        self._cancelled = threading.Event()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or None if unbounded."""
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def budget(self, reserve: float = 0.0) -> Optional[float]:
+        """Time for the next step, holding back ``reserve`` seconds for later ones.
+
+        At most half of the remaining time is held back, so a slow step near
+        the end of the budget is not starved by steps that may never run.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return None
+        return remaining - min(reserve, remaining / 2)
+
+    @property
+    def expired(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Abort the request; the next ``check`` raises ``DeadlineExceeded``."""
+        if not self._cancelled.is_set():
+            self.reason = reason
+            self._cancelled.set()
+
+    def check(self, what: str = "Request") -> None:
+        """Raise ``DeadlineExceeded`` if the request was cancelled or timed out.
+
+        Args:
+            what: Description of the step, used in the error message.
+        """
+        if self.cancelled:
+            raise DeadlineExceeded(f"{what} aborted: {self.reason}")
+        if self.expired:
+            raise DeadlineExceeded(f"{what} exceeded the {self.timeout:.1f}s request deadline")
+
+    def bind(self, function: Callable[..., Any]) -> Callable[..., Any]:
+        """Wrap ``function`` so it runs with this deadline as the current one.
+
+        Useful when handing work to a thread, where context variables set by
+        the caller are not guaranteed to be visible.
+        """
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            token = current_deadline.set(self)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                current_deadline.reset(token)
+
+        return wrapper
+
+
+current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+
+
+def timeout_kwargs(deadline: Optional[Deadline], reserve: float = 0.0) -> Dict[str, Any]:
+    """Build the ``timeout`` request option for an OpenAI client call.
+
+    The OpenAI client treats ``timeout=None`` as "wait forever", so nothing is
+    passed when there is no deadline and the client default applies.
+
+    Args:
+        deadline: The request deadline, if any.
+        reserve: Seconds to hold back for steps after this call.
+
+    Returns:
+        Keyword arguments to splat into the client call.
+    """
+    if deadline is None:
+        return {}
+    budget = deadline.budget(reserve)
+    if budget is None:
+        return {}
+    deadline.check()
+    return {"timeout": budget}
+
+
+def parse_timeout_header(value: Optional[str], default: float, maximum: float) -> float:
+    """Parse an ``X-Request-Timeout`` header value in seconds.
+
+    Args:
+        value: The raw header value, if present.
+        default: Timeout used when the header is missing or invalid.
+        maximum: Upper bound; clients may only shorten the server budget.
+
+    Returns:
+        The timeout to use, in seconds.
+    """
+    try:
+        timeout = float(value) if value else default
+    except ValueError:
+        timeout = default
+    if timeout <= 0:
+        timeout = default
+    return min(timeout, maximum)
+
+
+async def cancel_on_disconnect(request: Any, deadline: Deadline, poll_interval: float = 0.5) -> None:
+    """Cancel ``deadline`` as soon as the client of ``request`` disconnects.
+
+    Work stops at its next deadline check; an upstream call already in
+    flight is not aborted (see ``Deadline``).
+
+    Args:
+        request: The incoming Starlette request.
+        deadline: The deadline to cancel.
+        poll_interval: Seconds between disconnect checks.
+    """
+    while not deadline.cancelled and not deadline.expired:
+        if await request.is_disconnected():
+            deadline.cancel("client disconnected")
+            return
+        await asyncio.sleep(poll_interval)
+
+
+async def run_with_deadline(
+    deadline: Deadline,
+    function: Callable[..., Any],
+    /,
+    *args: Any,
+    request: Any = None,
+    **kwargs: Any,
+) -> Any:
+    """Run a blocking function in the threadpool under ``deadline``.
+
+    The caller's context variables (such as the current trace span) are
+    carried over to the worker thread.
+
+    ``deadline`` and ``function`` are positional-only, so ``function`` may
+    itself take a ``deadline`` keyword argument.
+
+    Args:
+        deadline: The request deadline.
+        function: The blocking function to run.
+        request: If given, the deadline is cancelled when this client disconnects.
+
+    Returns:
+        The function's result.
+    """
+    watcher = None
+    if request is not None:
+        watcher = asyncio.ensure_future(cancel_on_disconnect(request, deadline))
+    try:
+        context = copy_context()
+        return await run_in_threadpool(context.run, deadline.bind(function), *args, **kwargs)
+    except asyncio.CancelledError:
+        deadline.cancel("request task cancelled")
+        raise
+    finally:
+        if watcher is not None:
+            watcher.cancel()
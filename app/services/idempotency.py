@@ -0,0 +1,131 @@
+"""Idempotency-Key support for retried POST requests."""
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import time
+
+
+class IdempotencyKeyConflict(ValueError):
+    """Raised when an idempotency key is reused with a different request body."""
+
+
+def request_fingerprint(payload: Dict[str, Any]) -> str:
+    """Return a stable hash of a request payload.
+
+    Args:
+        payload: The JSON-serializable request body.
+
+    Returns:
+        Hex digest identifying the payload.
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    """A single idempotency key, either in flight or completed."""
+
+    __slots__ = ("fingerprint", "future", "expires_at")
+
+    def __init__(self, fingerprint: str, future: "asyncio.Future[Any]"):
+        self.fingerprint = fingerprint
+        self.future = future
+        self.expires_at: Optional[float] = None
+
+
+class IdempotencyStore:
+    """Bounded, TTL-evicted store of in-flight and completed responses.
+
+    A repeated key while the first request is still running attaches to the
+    in-flight computation; a repeated key after it finished replays the stored
+    result. Failed computations are not stored, so a retry runs again.
+    """
+
+    def __init__(self, ttl_seconds: float = 86400.0, max_entries: int = 10000):
+        """Initialize the store.
+
+        Args:
+            ttl_seconds: How long a completed response is kept for replay.
+            max_entries: Maximum number of completed responses kept.
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # Completed entries in completion order, hence also in expiry order.
+        # In-flight entries are kept apart and never evicted; they are
+        # bounded by concurrency.
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._inflight: Dict[str, _Entry] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries) + len(self._inflight)
+
+    def _evict(self, now: float) -> None:
+        """Drop expired entries, then the oldest completed ones over capacity."""
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if oldest.expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    async def run(
+        self,
+        key: str,
+        fingerprint: str,
+        compute: Callable[[], Awaitable[Any]],
+    ) -> Tuple[Any, bool]:
+        """Run ``compute`` at most once per key.
+
+        Args:
+            key: The idempotency key, already namespaced by route.
+            fingerprint: Fingerprint of the request body (see ``request_fingerprint``).
+            compute: Coroutine factory producing the response.
+
+        Returns:
+            Tuple of (result, replayed) where ``replayed`` is True when the result
+            came from an earlier or concurrent request with the same key.
+
+        Raises:
+            IdempotencyKeyConflict: If the key was used with a different body.
+        """
+        while True:
+            self._evict(time.monotonic())
+            entry = self._inflight.get(key) or self._entries.get(key)
+            if entry is None:
+                break
+            if entry.fingerprint != fingerprint:
+                raise IdempotencyKeyConflict(
+                    f"Idempotency key '{key}' was already used with a different request"
+                )
+            try:
+                return await asyncio.shield(entry.future), True
+            except asyncio.CancelledError:
+                # The original request was abandoned; run it ourselves unless
+                # it is this request that is being cancelled.
+                if not entry.future.cancelled():
+                    raise
+
+        future: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+        entry = _Entry(fingerprint, future)
+        self._inflight[key] = entry
+        try:
+            result = await compute()
+        except asyncio.CancelledError:
+            self._inflight.pop(key, None)
+            future.cancel()
+            raise
+        except Exception as e:
+            self._inflight.pop(key, None)
+            future.set_exception(e)
+            # Attached requests re-raise it; mark it retrieved for the rest.
+            future.exception()
+            raise
+
+        entry.expires_at = time.monotonic() + self.ttl_seconds
+        del self._inflight[key]
+        self._entries[key] = entry
+        future.set_result(result)
+        self._evict(time.monotonic())
+        return result, False
@@ -1,11 +1,43 @@
 """OpenAI service for handling OpenAI API interactions."""
 
-from typing import Optional, Dict, Any, Callable, List, Union
+from typing import Optional, Dict, Any, Callable, Sequence, Tuple
 import os
 import json
 from openai import OpenAI
 from pydantic import BaseModel
-from search_prompt import search_prompt
+from app.services.deadline import Deadline, DeadlineExceeded, current_deadline, timeout_kwargs
+from app.services.tracing import record_usage, span
+from app.services.tool import Tool, ToolArgumentError, ToolRegistry
+from app.services.prompts import prompts
+from app.config import settings
+from app.services.cassette import http_client
+
+# Seconds of the request deadline a tool-loop model call leaves for the
+# tool calls and follow-up call it may trigger
+TOOL_LOOP_RESERVE_SECONDS = 15.0
+
+def extract_output_text(response: Dict[str, Any]) -> str:
+    """Join the text parts of a dumped Responses API result.
+
+    ``output_text`` is a convenience property on the SDK object and is not
+    part of ``model_dump()``, so the message parts are collected here.
+
+    Args:
+        response: The dict returned by ``create_web_search_response``.
+
+    Returns:
+        The concatenated output text.
+    """
+    if response.get("output_text"):
+        return response["output_text"]
+    parts = []
+    for item in response.get("output") or []:
+        if item.get("type") != "message":
+            continue
+        for content in item.get("content") or []:
+            if content.get("type") == "output_text":
+                parts.append(content.get("text", ""))
+    return "".join(parts)
 
 class OpenAIConfig(BaseModel):
     """OpenAI configuration settings."""
@@ -31,6 +63,9 @@ class OpenAIService:
             max_tokens: Maximum tokens for completions.
         """
         api_key = os.getenv("METIS_OPENAI_KEY", "")
+        if not api_key and settings.cassette_mode == "replay":
+            # Replayed responses never reach the API, so any key will do
+            api_key = "cassette-replay"
         if not api_key:
             raise ValueError("METIS_OPENAI_KEY environment variable is not set")
             
@@ -40,9 +75,40 @@ class OpenAIService:
             temperature=temperature,
             max_tokens=max_tokens,
         )
-        self.client = OpenAI(api_key=self.config.api_key, base_url=os.getenv("METIS_BASE_URL", "https://api.openai.com/v1"))
-        self.registered_functions: Dict[str, Callable] = {}
-        self.tool_definitions: List[Dict[str, Any]] = []
+        self.client = OpenAI(
+            api_key=self.config.api_key,
+            base_url=os.getenv("METIS_BASE_URL", "https://api.openai.com/v1"),
+            http_client=http_client(),
+        )
+        self.tools = ToolRegistry()
+
+    @property
+    def registered_functions(self) -> Dict[str, Callable]:
+        """Callable of each registered function tool, by name."""
+        return {
+            name: self.tools.get(name).function
+            for name in self.tools.names()
+            if self.tools.get(name).function is not None
+        }
+
+    @property
+    def tool_definitions(self) -> Tuple[Dict[str, Any], ...]:
+        """The frozen ``tools`` payload for every registered tool.
+
+        Use ``register_tool`` to add tools; the tuple cannot be appended to.
+        """
+        return self.tools.payload()
+
+    def register_tool(self, tool: Tool) -> None:
+        """Register a tool, replacing any registered tool with the same name.
+
+        The tool's parameter schema is validated and compiled here so each
+        call's arguments can be checked cheaply before execution.
+
+        Args:
+            tool: A Tool instance containing the tool definition.
+        """
+        self.tools.register(tool)
 
     def register_function(
         self,
@@ -79,36 +145,56 @@ class OpenAIService:
                 }
             )
         """
-        self.registered_functions[name] = function
-        self.tool_definitions.append({
-            "type": "function",
-            "function": {
-                "name": name,
-                "description": description,
-                "parameters": parameters
-            }
-        })
+        self.register_tool(Tool(
+            type="function",
+            name=name,
+            description=description,
+            parameters=parameters,
+            function=function,
+        ))
 
-    def _execute_tool_call(self, tool_call: Dict[str, Any]) -> Dict[str, Any]:
+    def _execute_tool_call(
+        self,
+        tool_call: Dict[str, Any],
+        allowed: Optional[Sequence[str]] = None,
+    ) -> Dict[str, Any]:
         """Execute a tool call and return the result.
         
+        Arguments that are not valid JSON or do not match the tool's schema
+        are reported back to the model as the tool result instead of calling
+        the function, so it can correct itself.
+
         Args:
             tool_call: The tool call from the model's response.
+            allowed: Names of the tools offered in this request, if a subset.
             
         Returns:
             Dictionary containing the tool call result.
         """
         function_name = tool_call["function"]["name"]
-        function_args = json.loads(tool_call["function"]["arguments"])
         
         print(f"\n🤖 Executing tool: {function_name}")
-        print(f"📝 Arguments: {function_args}")
+        print(f"📝 Arguments: {tool_call['function']['arguments']}")
         
-        if function_name not in self.registered_functions:
+        tool = self.tools.get(function_name)
+        if tool is None or tool.function is None or (allowed is not None and function_name not in allowed):
             raise ValueError(f"Function {function_name} is not registered")
+
+        try:
+            function_args = json.loads(tool_call["function"]["arguments"] or "{}")
+            self.tools.validate_arguments(function_name, function_args)
+        except (json.JSONDecodeError, ToolArgumentError) as e:
+            print(f"⚠️ Invalid arguments: {e}\n")
+            return {
+                "tool_call_id": tool_call["id"],
+                "role": "tool",
+                "name": function_name,
+                "content": f"Error: invalid arguments for {function_name}: {e}",
+            }
             
-        function = self.registered_functions[function_name]
-        result = function(**function_args)
+        function = tool.function
+        with span(f"tool.{function_name}"):
+            result = function(**function_args)
         print(f"✅ Result: {result}\n")
         
         return {
@@ -123,6 +209,8 @@ class OpenAIService:
         messages: list[Dict[str, str]],
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
+        deadline: Optional[Deadline] = None,
+        prompt: Optional[str] = None,
     ) -> Dict[str, Any]:
         """Create a chat completion.
         
@@ -130,17 +218,33 @@ class OpenAIService:
             messages: List of message dictionaries with 'role' and 'content'.
             temperature: Optional override for temperature.
             max_tokens: Optional override for max tokens.
+            deadline: Optional request deadline; defaults to ``current_deadline``.
+            prompt: Name of the registered prompt leading ``messages``, to
+                attribute prompt-cache usage to.
             
         Returns:
             The chat completion response.
         """
-        response = self.client.chat.completions.create(
-            model=self.config.model,
-            messages=messages,
-            temperature=temperature or self.config.temperature,
-            max_tokens=max_tokens or self.config.max_tokens,
-        )
-        return response.model_dump()
+        if deadline is None:
+            deadline = current_deadline.get()
+        with span("llm.chat_completion", model=self.config.model) as llm_span:
+            try:
+                response = self.client.chat.completions.create(
+                    model=self.config.model,
+                    messages=messages,
+                    temperature=temperature or self.config.temperature,
+                    max_tokens=max_tokens or self.config.max_tokens,
+                    **timeout_kwargs(deadline),
+                )
+            except Exception as e:
+                if deadline is not None and (deadline.expired or deadline.cancelled):
+                    raise DeadlineExceeded("Chat completion exceeded the request deadline") from e
+                raise
+            response_dict = response.model_dump()
+            record_usage(llm_span, response_dict.get("usage"))
+        if prompt is not None:
+            prompts.record_usage(prompt, response_dict.get("usage"))
+        return response_dict
 
 
     def create_chat_completion_with_tools(
@@ -149,54 +253,100 @@ class OpenAIService:
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
         max_iterations: int = 5,
+        deadline: Optional[Deadline] = None,
+        tools: Optional[Sequence[str]] = None,
+        prompt: Optional[str] = None,
     ) -> Dict[str, Any]:
-        """Create a chat completion with tools support and handle tool execution."""
-        if not self.tool_definitions:
+        """Create a chat completion with tools support and handle tool execution.
+
+        ``tools`` limits the request to the named registered tools; by default
+        all of them are offered. ``prompt`` names the registered system prompt
+        leading ``messages`` so each iteration's cache usage is recorded.
+
+        When a ``deadline`` is given, each model call may use the remaining
+        time minus a reserve for tool execution and the follow-up call (none
+        on the last iteration), and the loop stops with
+        ``DeadlineExceeded`` as soon as the deadline passes or is cancelled.
+        Tools run with it set as ``current_deadline``.
+        """
+        if not self.tools:
             raise ValueError("No functions registered. Use register_function() first.")
+        try:
+            tool_payload = self.tools.payload(tools)
+        except KeyError as e:
+            raise ValueError(f"Tool {e} is not registered") from None
             
         print("\n🔄 Starting conversation with tools")
-        print(f"📋 Available tools: {[tool for tool in self.tool_definitions]}")
+        print(f"📋 Available tools: {list(tools) if tools is not None else self.tools.names()}")
         
         current_messages = messages.copy()
         iterations = 0
+        if deadline is None:
+            deadline = current_deadline.get()
         
         while iterations < max_iterations:
             try:
-                print(f"\n📝 Iteration {iterations + 1}/{max_iterations}")
+                with span("llm.iteration", iteration=iterations + 1) as iteration_span:
+                    print(f"\n📝 Iteration {iterations + 1}/{max_iterations}")
+                    if deadline is not None:
+                        deadline.check(f"Iteration {iterations + 1}/{max_iterations}")
                 
-                response = self.client.chat.completions.create(
-                    model=self.config.model,
-                    messages=current_messages,
-                    tools=self.tool_definitions,
-                    tool_choice="auto",
-                    temperature=temperature or self.config.temperature,
-                    max_tokens=max_tokens or self.config.max_tokens,
-                )
-                response_dict = response.model_dump()
+                    response = self.client.chat.completions.create(
+                        model=self.config.model,
+                        messages=current_messages,
+                        tools=tool_payload,
+                        tool_choice="auto",
+                        temperature=temperature or self.config.temperature,
+                        max_tokens=max_tokens or self.config.max_tokens,
+                        **timeout_kwargs(
+                            deadline,
+                            0.0 if iterations + 1 == max_iterations else TOOL_LOOP_RESERVE_SECONDS,
+                        ),
+                    )
+                    response_dict = response.model_dump()
+                    record_usage(iteration_span, response_dict.get("usage"))
+                    if prompt is not None:
+                        prompts.record_usage(prompt, response_dict.get("usage"))
                 
-                # Get the assistant's message
-                assistant_message = response_dict["choices"][0]["message"]
-                print(f"💭 Assistant: {assistant_message.get('content', '')}")
+                    # Get the assistant's message
+                    assistant_message = response_dict["choices"][0]["message"]
+                    print(f"💭 Assistant: {assistant_message.get('content', '')}")
                 
-                current_messages.append(assistant_message)
+                    current_messages.append(assistant_message)
                 
-                # If there are no tool calls, we're done
-                if not assistant_message.get("tool_calls"):
-                    print("✨ Conversation complete\n")
-                    return response_dict
+                    # If there are no tool calls, we're done
+                    if not assistant_message.get("tool_calls"):
+                        print("✨ Conversation complete\n")
+                        iteration_span.set(tool_calls=0)
+                        return response_dict
                     
-                # Execute all tool calls
-                tool_calls = assistant_message.get("tool_calls", [])
-                print(f"🔧 Executing {len(tool_calls)} tool calls")
+                    # Execute all tool calls
+                    tool_calls = assistant_message.get("tool_calls", [])
+                    print(f"🔧 Executing {len(tool_calls)} tool calls")
+                    iteration_span.set(tool_calls=len(tool_calls))
                 
-                for tool_call in tool_calls:
-                    # Handle function tools
-                    tool_result = self._execute_tool_call(tool_call)
-                    current_messages.append(tool_result)
+                    for tool_call in tool_calls:
+                        # Handle function tools
+                        if deadline is not None:
+                            deadline.check(f"Tool {tool_call['function']['name']}")
+                            tool_result = deadline.bind(self._execute_tool_call)(tool_call, tools)
+                        else:
+                            tool_result = self._execute_tool_call(tool_call, tools)
+                        current_messages.append(tool_result)
                     
-                iterations += 1
+                    iterations += 1
                 
             except Exception as e:
+                deadline_hit = deadline is not None and (deadline.expired or deadline.cancelled)
+                if deadline_hit and not isinstance(e, DeadlineExceeded):
+                    # An upstream timeout caused by the deadline; report it as such
+                    print(f"\n⏱️ Deadline reached in iteration {iterations + 1}")
+                    raise DeadlineExceeded(
+                        f"Iteration {iterations + 1}/{max_iterations} exceeded the request deadline"
+                    ) from e
+                if isinstance(e, DeadlineExceeded):
+                    print(f"\n⏱️ {e}")
+                    raise
                 print(f"\n❌ Error in iteration {iterations + 1}:")
                 print(f"Error type: {type(e).__name__}")
                 print(f"Error message: {str(e)}")
@@ -211,12 +361,17 @@ class OpenAIService:
         self,
         input_text: str,
         temperature: Optional[float] = None,
+        deadline: Optional[Deadline] = None,
     ) -> Dict[str, Any]:
         """Create a response using web search.
+
+        The static ``web_search`` prompt is sent as ``instructions`` so it forms
+        an identical, cacheable prefix; only ``input_text`` varies per call.
         
         Args:
             input_text: The input text to search for.
             temperature: Optional override for temperature.
+            deadline: Optional request deadline; defaults to ``current_deadline``.
             
         Returns:
             The response from the model.
@@ -224,12 +379,20 @@ class OpenAIService:
         print("\n🔄 Starting web search response")
         print(f"📝 Input: {input_text}")
 
+        if deadline is None:
+            deadline = current_deadline.get()
         
-        response = self.client.responses.create(
-            model="gpt-4.1-mini",
-            tools=[{"type": "web_search_preview"}],
-            include=["web_search_call.results"],
-            input=f"{search_prompt}{input_text}",
-            temperature=temperature or self.config.temperature,
-        )
-        return response.model_dump()
+        with span("llm.web_search", model="gpt-4.1-mini") as llm_span:
+            response = self.client.responses.create(
+                model="gpt-4.1-mini",
+                tools=[{"type": "web_search_preview"}],
+                include=["web_search_call.results"],
+                instructions=prompts.text("web_search"),
+                input=input_text,
+                temperature=temperature or self.config.temperature,
+                **timeout_kwargs(deadline),
+            )
+            response_dict = response.model_dump()
+            record_usage(llm_span, response_dict.get("usage"))
+        prompts.record_usage("web_search", response_dict.get("usage"))
+        return response_dict
@@ -0,0 +1,142 @@
+"""TTL cache of product descriptions and summaries."""
+
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import copy_context
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+import re
+import threading
+import time
+
+from app.services.deadline import current_deadline
+from app.services.openai_service import OpenAIService, extract_output_text
+from app.services.tracing import span
+
+
+def canonical_key(brand_model: str) -> str:
+    """Normalize a ``brand-model`` string so spelling variants share an entry."""
+    return re.sub(r"\s+", " ", brand_model.strip().lower())
+
+
+@dataclass
+class ProductInfo:
+    """A cached description and summary of one product."""
+    description: str
+    summary: str
+    computed_at: float
+    expires_at: float
+
+
+def describe_product(key: str) -> Tuple[str, str]:
+    """Compute a product's description (web search) and summary (personas)."""
+    # Imported lazily: autogen is only needed once something is computed
+    from SummarizeAgent.agents import SummarizeAgent
+
+    response = OpenAIService().create_web_search_response(input_text=key)
+    description = extract_output_text(response)
+    summary = SummarizeAgent(description).run()
+    return description, summary
+
+
+class ProductCache:
+    """Bounded LRU of ``ProductInfo`` with a TTL and single-flight misses.
+
+    Concurrent misses for the same product wait for one computation instead
+    of each running the web search and persona fan-out. That computation
+    runs on the cache's own threads without any caller's deadline; each
+    caller only bounds its own wait by its ``current_deadline``.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 6 * 3600,
+        max_entries: int = 5000,
+        compute: Callable[[str], Tuple[str, str]] = describe_product,
+        workers: int = 8,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.compute = compute
+        self._entries: "OrderedDict[str, ProductInfo]" = OrderedDict()
+        self._inflight: Dict[str, "Future[ProductInfo]"] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="product-cache")
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def peek(self, key: str) -> Optional[ProductInfo]:
+        """The cached entry, expired or not, without touching stats or LRU order."""
+        with self._lock:
+            return self._entries.get(key)
+
+    def get(self, key: str) -> Tuple[ProductInfo, bool]:
+        """Return the product's info, computing it on a miss.
+
+        Args:
+            key: A canonical ``brand-model`` key.
+
+        Returns:
+            Tuple of (info, hit) where ``hit`` is False if it was computed.
+        """
+        with span("product.cache", product=key) as cache_span:
+            with self._lock:
+                info = self._entries.get(key)
+                if info is not None and info.expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    cache_span.set(cache="hit")
+                    return info, True
+                self.misses += 1
+            cache_span.set(cache="miss")
+            return self._compute(key), False
+
+    def refresh(self, key: str) -> ProductInfo:
+        """Recompute an entry ahead of its expiry."""
+        with self._lock:
+            self.refreshes += 1
+        return self._compute(key)
+
+    def _compute(self, key: str) -> ProductInfo:
+        """Start or join the computation of ``key`` and wait for it.
+
+        Raises:
+            TimeoutError: If ``current_deadline`` passes first; the
+                computation itself carries on and still fills the cache.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                # Keep the trace context but drop the caller's deadline
+                context = copy_context()
+                context.run(current_deadline.set, None)
+                future = self._inflight[key] = self._executor.submit(context.run, self._fill, key)
+        deadline = current_deadline.get()
+        return future.result(timeout=deadline.remaining() if deadline else None)
+
+    def _fill(self, key: str) -> ProductInfo:
+        try:
+            description, summary = self.compute(key)
+        except BaseException:
+            with self._lock:
+                del self._inflight[key]
+            raise
+        now = time.time()
+        info = ProductInfo(description, summary, computed_at=now, expires_at=now + self.ttl_seconds)
+        with self._lock:
+            self._entries[key] = info
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            del self._inflight[key]
+        return info
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+            }
@@ -0,0 +1,155 @@
+"""Versioned registry of static prompts with prompt-cache telemetry.
+
+Providers cache the longest byte-identical prefix of a request, so every
+static prompt is registered here once and always sent verbatim as the
+leading system/instructions segment, with per-request content strictly after
+it. Each call records the ``cached_tokens`` the provider reported, and
+``PromptRegistry.report`` shows the cache-hit ratio per prompt version.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+import threading
+
+from search_prompt import search_prompt
+from system_prompt import system_prompt
+
+
+@dataclass(frozen=True)
+class Prompt:
+    """A static prompt; bump ``version`` whenever ``text`` changes."""
+    name: str
+    version: str
+    text: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}@{self.version}"
+
+
+class _PromptStats:
+    __slots__ = ("calls", "untracked_calls", "input_tokens", "cached_tokens", "cache_hits")
+
+    def __init__(self):
+        self.calls = 0
+        self.untracked_calls = 0
+        self.input_tokens = 0
+        self.cached_tokens = 0
+        self.cache_hits = 0
+
+
+class PromptRegistry:
+    """Prompts by name, plus per-version cache statistics."""
+
+    def __init__(self):
+        self._prompts: Dict[str, Prompt] = {}
+        self._stats: Dict[str, _PromptStats] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, version: str, text: str) -> Prompt:
+        """Register (or replace) the prompt ``name`` at ``version``."""
+        prompt = Prompt(name=name, version=version, text=text)
+        self._prompts[name] = prompt
+        return prompt
+
+    def get(self, name: str) -> Prompt:
+        """Return the registered prompt.
+
+        Raises:
+            KeyError: If no prompt is registered under ``name``.
+        """
+        return self._prompts[name]
+
+    def text(self, name: str) -> str:
+        return self._prompts[name].text
+
+    def record_usage(self, name: str, usage: Optional[Dict[str, Any]]) -> None:
+        """Record token usage of one call made with prompt ``name``.
+
+        Args:
+            name: The prompt name.
+            usage: The ``usage`` dict of a chat or responses API result. Calls
+                whose usage lacks ``cached_tokens`` are counted as untracked
+                and left out of the hit ratio.
+        """
+        key = self._prompts[name].key
+        usage = usage or {}
+        details = usage.get("prompt_tokens_details") or usage.get("input_tokens_details") or {}
+        input_tokens = usage.get("prompt_tokens", usage.get("input_tokens"))
+        cached_tokens = details.get("cached_tokens")
+        with self._lock:
+            stats = self._stats.setdefault(key, _PromptStats())
+            stats.calls += 1
+            if input_tokens is None or cached_tokens is None:
+                stats.untracked_calls += 1
+                return
+            stats.input_tokens += input_tokens
+            stats.cached_tokens += cached_tokens
+            if cached_tokens > 0:
+                stats.cache_hits += 1
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Cache statistics per prompt version.
+
+        ``cached_token_ratio`` is the share of input tokens served from the
+        provider cache; ``hit_ratio`` is the share of calls with any hit.
+        """
+        with self._lock:
+            report = {}
+            for key, stats in self._stats.items():
+                tracked = stats.calls - stats.untracked_calls
+                report[key] = {
+                    "calls": stats.calls,
+                    "untracked_calls": stats.untracked_calls,
+                    "input_tokens": stats.input_tokens,
+                    "cached_tokens": stats.cached_tokens,
+                    "cached_token_ratio": round(stats.cached_tokens / stats.input_tokens, 4) if stats.input_tokens else None,
+                    "hit_ratio": round(stats.cache_hits / tracked, 4) if tracked else None,
+                }
+            return report
+
+    def format_report(self) -> str:
+        """Plain-text version of ``report``, one line per prompt."""
+        lines = []
+        for key, row in sorted(self.report().items()):
+            ratio = "n/a" if row["cached_token_ratio"] is None else f"{row['cached_token_ratio']:.1%}"
+            lines.append(
+                f"{key}: {row['calls']} calls, {row['cached_tokens']}/{row['input_tokens']} "
+                f"input tokens cached ({ratio})"
+            )
+        return "\n".join(lines)
+
+
+prompts = PromptRegistry()
+
+prompts.register("web_search", "1", search_prompt)
+prompts.register("browsing_agent", "1", system_prompt)
+
+prompts.register("product_identifier", "1", """You are a product expert. Extract brand and model. You Only use latin.
+Return ONLY valid JSON exactly with keys `brand` and `model` in lowercase Latin letters.
+If unknown, output {"brand": null, "model": null}.""")
+
+prompts.register(
+    "summarize.budgetman",
+    "1",
+    "You look for affordable products all the time. Saving money if your life goal. give me a summary and review then evaluate the product, should user buy it or no?, talk to user",
+)
+prompts.register(
+    "summarize.qualityman",
+    "1",
+    "You look for high quality products all the time. Just quality and reliabilty are important. You look for well known brands, give me a summary, review then evaluate the product, should user buy it?, talk to user",
+)
+prompts.register(
+    "summarize.wiseman",
+    "1",
+    "You are wiseman so your choice are logical and based on facts in all aspects. give me a summary, review then evaluate the product, should user buy it?, talk to user",
+)
+prompts.register(
+    "summarize.coordinator",
+    "1",
+    "You are a coordinator that receives the outputs of multiple agents and creates a final summary report."
+    + "Make sure to integrate all perspectives into a unified output."
+    + "Evaluate the product, guide user and suggest the product if it meets the needs."
+    + "you suggest it, give user tips and advices"
+    + "Response with one sentence for reiview, one for advices and one for conclusion that who should buy this product and who should avoid it",
+)
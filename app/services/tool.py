@@ -1,7 +1,7 @@
 """Tool definitions and implementations for agents."""
 
 from dataclasses import dataclass
-from typing import Callable, Dict, Any, Optional, Union, Literal
+from typing import Callable, Dict, Any, FrozenSet, Iterable, List, Optional, Tuple, Union, Literal
 
 @dataclass
 class Tool:
@@ -42,3 +42,185 @@ class Tool:
         elif self.type == "web_search_preview":
             return {"type": "web_search_preview"}
         return {"type": self.type}
+
+
+class ToolSchemaError(ValueError):
+    """Raised when a tool's parameters are not a usable JSON Schema."""
+
+
+class ToolArgumentError(ValueError):
+    """Raised when tool call arguments do not match the tool's schema."""
+
+
+_JSON_TYPES: Dict[str, Tuple[type, ...]] = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "object": (dict,),
+    "array": (list,),
+    "null": (type(None),),
+}
+
+Validator = Callable[[Any, str], None]
+
+
+def compile_schema(schema: Dict[str, Any], path: str = "$") -> Validator:
+    """Compile a JSON Schema into a validator function.
+
+    Supports the subset used for function tools: ``type``, ``enum``,
+    ``properties``, ``required``, ``additionalProperties: false`` and
+    ``items``. Other keywords are accepted and ignored. The schema is checked
+    once here so that validating each call is just a few type checks.
+
+    Args:
+        schema: The JSON Schema.
+        path: Location of ``schema`` within the root schema, for errors.
+
+    Returns:
+        A function ``validate(value, path)`` raising ``ToolArgumentError``.
+
+    Raises:
+        ToolSchemaError: If the schema is malformed.
+    """
+    if not isinstance(schema, dict):
+        raise ToolSchemaError(f"{path}: schema must be an object")
+    checks: List[Validator] = []
+
+    declared = schema.get("type")
+    if declared is not None:
+        names = [declared] if isinstance(declared, str) else list(declared)
+        unknown = [name for name in names if name not in _JSON_TYPES]
+        if unknown:
+            raise ToolSchemaError(f"{path}: unknown type(s) {unknown}")
+        allowed = tuple(t for name in names for t in _JSON_TYPES[name])
+        # bool is an int subclass, but JSON keeps them apart
+        allow_bool = "boolean" in names
+
+        def check_type(value: Any, at: str) -> None:
+            if not isinstance(value, allowed) or (isinstance(value, bool) and not allow_bool):
+                raise ToolArgumentError(f"{at}: expected {' or '.join(names)}, got {type(value).__name__}")
+
+        checks.append(check_type)
+
+    if "enum" in schema:
+        options = list(schema["enum"])
+
+        def check_enum(value: Any, at: str) -> None:
+            if value not in options:
+                raise ToolArgumentError(f"{at}: must be one of {options}")
+
+        checks.append(check_enum)
+
+    properties = schema.get("properties", {})
+    if not isinstance(properties, dict):
+        raise ToolSchemaError(f"{path}.properties: must be an object")
+    compiled = {name: compile_schema(sub, f"{path}.{name}") for name, sub in properties.items()}
+    required = schema.get("required", [])
+    if not isinstance(required, list) or not all(isinstance(name, str) for name in required):
+        raise ToolSchemaError(f"{path}.required: must be a list of property names")
+    closed = schema.get("additionalProperties") is False
+    if compiled or required or closed:
+
+        def check_object(value: Any, at: str) -> None:
+            if not isinstance(value, dict):
+                return
+            for name in required:
+                if name not in value:
+                    raise ToolArgumentError(f"{at}: missing required property '{name}'")
+            for name, item in value.items():
+                validator = compiled.get(name)
+                if validator is not None:
+                    validator(item, f"{at}.{name}")
+                elif closed:
+                    raise ToolArgumentError(f"{at}: unexpected property '{name}'")
+
+        checks.append(check_object)
+
+    if "items" in schema:
+        item_validator = compile_schema(schema["items"], f"{path}[]")
+
+        def check_items(value: Any, at: str) -> None:
+            if isinstance(value, list):
+                for index, item in enumerate(value):
+                    item_validator(item, f"{at}[{index}]")
+
+        checks.append(check_items)
+
+    def validate(value: Any, at: str = "$") -> None:
+        for check in checks:
+            check(value, at)
+
+    return validate
+
+
+class ToolRegistry:
+    """Tools keyed by name, each stored once with a precompiled validator.
+
+    The serialized ``tools`` payload sent to the model is built once per
+    set of tool names, frozen as a tuple, and reused until a tool is
+    (re-)registered. Only registered names are accepted, so the number of
+    cached payloads is bounded by the registered tools.
+    """
+
+    def __init__(self):
+        self._tools: Dict[str, Tool] = {}
+        self._validators: Dict[str, Validator] = {}
+        self._payloads: Dict[Optional[FrozenSet[str]], Tuple[Dict[str, Any], ...]] = {}
+
+    def register(self, tool: Tool) -> None:
+        """Add ``tool``, replacing any tool with the same name.
+
+        Raises:
+            ToolSchemaError: If a function tool has no name or a bad schema.
+        """
+        name = tool.name or tool.type
+        if tool.type == "function":
+            if not tool.name:
+                raise ToolSchemaError("Function tools need a name")
+            self._validators[name] = compile_schema(tool.parameters or {"type": "object"}, name)
+        self._tools[name] = tool
+        self._payloads.clear()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def names(self) -> List[str]:
+        return list(self._tools)
+
+    def get(self, name: str) -> Optional[Tool]:
+        return self._tools.get(name)
+
+    def payload(self, names: Optional[Iterable[str]] = None) -> Tuple[Dict[str, Any], ...]:
+        """The ``tools`` request payload, for all tools or the given subset.
+
+        Duplicate names are ignored and tools keep their registration order,
+        so every spelling of a subset maps to one byte-identical payload.
+
+        Raises:
+            KeyError: If a requested tool is not registered.
+        """
+        key = None if names is None else frozenset(names)
+        payload = self._payloads.get(key)
+        if payload is None:
+            if key is not None:
+                for name in key:
+                    if name not in self._tools:
+                        raise KeyError(name)
+            selected = [tool for name, tool in self._tools.items() if key is None or name in key]
+            payload = tuple(tool.to_dict() for tool in selected)
+            self._payloads[key] = payload
+        return payload
+
+    def validate_arguments(self, name: str, arguments: Dict[str, Any]) -> None:
+        """Check call arguments against the tool's schema.
+
+        Raises:
+            ToolArgumentError: If the arguments do not match.
+        """
+        validator = self._validators.get(name)
+        if validator is not None:
+            validator(arguments, name)
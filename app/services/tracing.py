@@ -0,0 +1,273 @@
+"""Lightweight span-based request tracing.
+
+A sampled request gets a ``Trace``; code on its path opens child spans with
+``span(name, **attributes)``. When the request is not sampled no span is
+current and ``span`` returns a shared no-op, so instrumentation costs one
+context-variable lookup. Finished traces are kept in a small ring buffer and
+served as a waterfall by the debug API.
+"""
+
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+import random
+import threading
+import time
+import uuid
+
+
+class Span:
+    """A timed unit of work inside a trace."""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start", "end", "attributes", "status")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[int], attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = trace._next_span_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self.status = "ok"
+
+    def set(self, **attributes: Any) -> None:
+        """Attach attributes such as token counts or cache status."""
+        self.attributes.update(attributes)
+
+    @property
+    def duration(self) -> Optional[float]:
+        return None if self.end is None else self.end - self.start
+
+
+class Trace:
+    """All spans recorded for one request."""
+
+    def __init__(self, name: str):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.started_at = time.time()
+        self.spans: List[Span] = []
+        self._span_ids = 0
+        self._lock = threading.Lock()
+
+    def _next_span_id(self) -> int:
+        with self._lock:
+            self._span_ids += 1
+            return self._span_ids
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Spans in start order with offsets and depth, for a waterfall view."""
+        if not self.spans:
+            return {"trace_id": self.trace_id, "name": self.name, "spans": []}
+        origin = min(s.start for s in self.spans)
+        depths: Dict[int, int] = {}
+        spans = []
+        for s in sorted(self.spans, key=lambda s: s.start):
+            depth = depths.get(s.parent_id, -1) + 1 if s.parent_id is not None else 0
+            depths[s.span_id] = depth
+            spans.append({
+                "span_id": s.span_id,
+                "parent_id": s.parent_id,
+                "name": s.name,
+                "depth": depth,
+                "offset_ms": round((s.start - origin) * 1000, 2),
+                "duration_ms": None if s.end is None else round((s.end - s.start) * 1000, 2),
+                "status": s.status,
+                "attributes": s.attributes,
+            })
+        root = spans[0]
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": root["duration_ms"],
+            "spans": spans,
+        }
+
+    def render_waterfall(self, width: int = 60) -> str:
+        """Render the trace as a plain-text waterfall."""
+        data = self.to_dict()
+        spans = data["spans"]
+        if not spans:
+            return f"trace {self.trace_id}: no spans\n"
+        total = max((s["offset_ms"] + (s["duration_ms"] or 0)) for s in spans) or 1.0
+        label_width = max(len("  " * s["depth"] + s["name"]) for s in spans)
+        lines = [f"trace {self.trace_id} {self.name} {total:.1f}ms"]
+        for s in spans:
+            begin = int(s["offset_ms"] / total * width)
+            length = max(1, int((s["duration_ms"] or 0) / total * width))
+            bar = " " * begin + "█" * min(length, width - begin)
+            label = ("  " * s["depth"] + s["name"]).ljust(label_width)
+            duration = "running" if s["duration_ms"] is None else f"{s['duration_ms']:.1f}ms"
+            attributes = " ".join(f"{k}={v}" for k, v in s["attributes"].items())
+            lines.append(f"{label} |{bar.ljust(width)}| {duration} {attributes}".rstrip())
+        return "\n".join(lines) + "\n"
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _SpanContext:
+    """Context manager that opens a span and makes it current."""
+
+    __slots__ = ("_trace", "_name", "_parent_id", "_attributes", "_span", "_token")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[int], attributes: Dict[str, Any]):
+        self._trace = trace
+        self._name = name
+        self._parent_id = parent_id
+        self._attributes = attributes
+
+    def __enter__(self) -> Span:
+        self._span = Span(self._trace, self._name, self._parent_id, self._attributes)
+        self._trace.spans.append(self._span)
+        self._token = _current_span.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._span.end = time.perf_counter()
+        if exc is not None:
+            self._span.status = "error"
+            self._span.attributes["error"] = f"{type(exc).__name__}: {exc}"
+        _current_span.reset(self._token)
+
+
+class _NoopSpan:
+    """Stand-in for ``Span`` and its context manager when not tracing."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def set(self, **attributes: Any) -> None:
+        return None
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attributes: Any) -> Any:
+    """Open a child span of the current span, or a no-op if not tracing.
+
+    Example:
+        with span("tool.web_search", query=query) as s:
+            result = search(query)
+            s.set(results=len(result))
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return _NOOP
+    return _SpanContext(parent.trace, name, parent.span_id, attributes)
+
+
+def current_span() -> Any:
+    """The current span, or a no-op span if not tracing."""
+    return _current_span.get() or _NOOP
+
+
+def record_usage(target: Any, usage: Optional[Dict[str, Any]]) -> None:
+    """Attach token counts from a chat or responses API ``usage`` dict.
+
+    Args:
+        target: The span to annotate.
+        usage: The ``usage`` field of a dumped OpenAI response.
+    """
+    if not usage or target is _NOOP:
+        return
+    details = usage.get("prompt_tokens_details") or usage.get("input_tokens_details") or {}
+    target.set(
+        input_tokens=usage.get("prompt_tokens", usage.get("input_tokens")),
+        output_tokens=usage.get("completion_tokens", usage.get("output_tokens")),
+        cached_tokens=details.get("cached_tokens", 0),
+    )
+
+
+class Tracer:
+    """Samples requests into traces and keeps the most recent ones."""
+
+    def __init__(self, sample_rate: float = 0.0, capacity: int = 200):
+        """Initialize the tracer.
+
+        Args:
+            sample_rate: Fraction of requests traced (0 disables tracing).
+            capacity: Number of finished traces kept for lookup.
+        """
+        self.sample_rate = sample_rate
+        self.capacity = capacity
+        self._traces: "OrderedDict[str, Trace]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def should_sample(self, force: bool = False) -> bool:
+        return force or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def start(self, name: str, **attributes: Any) -> _SpanContext:
+        """Start a new trace; its root span context manager is returned."""
+        trace = Trace(name)
+        self._store(trace)
+        return _SpanContext(trace, name, None, attributes)
+
+    def _store(self, trace: Trace) -> None:
+        with self._lock:
+            self._traces[trace.trace_id] = trace
+            while len(self._traces) > self.capacity:
+                self._traces.popitem(last=False)
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        with self._lock:
+            return self._traces.get(trace_id)
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Summaries of the most recent traces, newest first."""
+        with self._lock:
+            traces = list(self._traces.values())[-limit:]
+        summaries = []
+        for trace in reversed(traces):
+            root = trace.spans[0] if trace.spans else None
+            summaries.append({
+                "trace_id": trace.trace_id,
+                "name": trace.name,
+                "started_at": trace.started_at,
+                "duration_ms": None if root is None or root.end is None else round(root.duration * 1000, 2),
+                "spans": len(trace.spans),
+            })
+        return summaries
+
+
+class TracingMiddleware:
+    """ASGI middleware that traces sampled HTTP requests.
+
+    A request is traced when sampled by the tracer or, if ``allow_force``
+    is set, when it sends ``X-Trace: 1``; the trace id is returned in the
+    ``X-Trace-Id`` header.
+    """
+
+    def __init__(self, app: Any, tracer: Tracer, allow_force: bool = False):
+        self.app = app
+        self.tracer = tracer
+        self.allow_force = allow_force
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        force = self.allow_force and (b"x-trace", b"1") in scope.get("headers", [])
+        if not self.tracer.should_sample(force):
+            await self.app(scope, receive, send)
+            return
+
+        with self.tracer.start(f"{scope['method']} {scope['path']}") as root:
+            trace_id = root.trace.trace_id.encode("latin-1")
+
+            async def send_with_trace_id(message: Dict[str, Any]) -> None:
+                if message["type"] == "http.response.start":
+                    root.set(status_code=message["status"])
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-trace-id", trace_id)]
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace_id)
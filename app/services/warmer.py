@@ -0,0 +1,293 @@
+"""Refresh-ahead warming of popular product cache entries.
+
+Request frequency per product is tracked in a count-min sketch, with the
+hottest products kept in a top-K heap. A background task recomputes hot
+entries shortly before they expire, so popular products never take a cold
+miss, while a token bucket caps how many refreshes run per minute.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+import asyncio
+import hashlib
+import heapq
+import logging
+import threading
+import time
+
+from app.services.product_cache import ProductCache, canonical_key
+
+logger = logging.getLogger(__name__)
+
+
+class CountMinSketch:
+    """Approximate per-key counters in fixed memory (``width * depth`` ints).
+
+    Uses conservative update, so estimates only ever over-count and do so
+    less than with plain increments.
+    """
+
+    def __init__(self, width: int = 2048, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self._rows: List[List[int]] = [[0] * width for _ in range(depth)]
+
+    def _cells(self, key: str) -> List[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8 * self.depth).digest()
+        return [int.from_bytes(digest[i * 8:(i + 1) * 8], "little") % self.width for i in range(self.depth)]
+
+    def add(self, key: str) -> int:
+        """Count one occurrence of ``key`` and return its new estimate."""
+        cells = self._cells(key)
+        estimate = min(row[cell] for row, cell in zip(self._rows, cells)) + 1
+        for row, cell in zip(self._rows, cells):
+            if row[cell] < estimate:
+                row[cell] = estimate
+        return estimate
+
+    def estimate(self, key: str) -> int:
+        return min(row[cell] for row, cell in zip(self._rows, self._cells(key)))
+
+    def decay(self) -> None:
+        """Halve every counter so popularity follows recent traffic."""
+        for row in self._rows:
+            for i, value in enumerate(row):
+                row[i] = value >> 1
+
+
+class TopK:
+    """The ``k`` keys with the highest counts, on a lazily cleaned min-heap."""
+
+    def __init__(self, k: int = 300):
+        self.k = k
+        self.counts: Dict[str, int] = {}
+        self._heap: List[Tuple[int, str]] = []
+
+    def _min(self) -> Tuple[int, str]:
+        # Drop heap entries made stale by later updates
+        while self._heap:
+            count, key = self._heap[0]
+            if self.counts.get(key) == count:
+                return count, key
+            heapq.heappop(self._heap)
+        raise IndexError("empty")
+
+    def offer(self, key: str, count: int) -> None:
+        """Record ``key``'s latest count, evicting the coldest key if full."""
+        if key not in self.counts and len(self.counts) >= self.k:
+            lowest, coldest = self._min()
+            if count <= lowest:
+                return
+            heapq.heappop(self._heap)
+            del self.counts[coldest]
+        self.counts[key] = count
+        heapq.heappush(self._heap, (count, key))
+        if len(self._heap) > 4 * self.k:
+            self._heap = [(c, k) for k, c in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def decay(self) -> None:
+        """Halve every count, forgetting keys that drop to zero."""
+        self.counts = {key: count >> 1 for key, count in self.counts.items() if count >> 1}
+        self._heap = [(c, k) for k, c in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def keys(self) -> List[str]:
+        return sorted(self.counts, key=self.counts.get, reverse=True)
+
+
+class RefreshAheadWarmer:
+    """Keeps hot product cache entries fresh in the background."""
+
+    def __init__(
+        self,
+        cache: ProductCache,
+        top_k: int = 300,
+        min_requests: int = 3,
+        refresh_ahead_seconds: float = 900.0,
+        interval_seconds: float = 30.0,
+        max_refreshes_per_minute: float = 10.0,
+        workers: int = 2,
+        decay_seconds: float = 3600.0,
+        max_backoff_seconds: float = 3600.0,
+        is_busy: Optional[Callable[[], bool]] = None,
+    ):
+        """Initialize the warmer.
+
+        Args:
+            cache: The product cache to keep warm.
+            top_k: Number of hottest products tracked.
+            min_requests: Tracked products need this many (decayed) requests
+                to be kept fresh, so one-off or mistyped products are not.
+            refresh_ahead_seconds: Refresh entries expiring within this window.
+            interval_seconds: How often to look for entries to refresh.
+            max_refreshes_per_minute: Rate cap on background refreshes.
+            workers: Threads used for refreshes; kept small so they stay low priority.
+            decay_seconds: How often popularity counts are halved.
+            max_backoff_seconds: Upper bound of the retry delay after failed
+                refreshes, which doubles from ``interval_seconds``.
+            is_busy: Returns True when live traffic is queueing; refreshes pause then.
+        """
+        self.cache = cache
+        self.sketch = CountMinSketch()
+        self.top = TopK(top_k)
+        self.min_requests = min_requests
+        self.pinned: Set[str] = set()
+        # key -> (consecutive failures, monotonic time of the next attempt)
+        self._backoff: Dict[str, Tuple[int, float]] = {}
+        self.max_backoff_seconds = max_backoff_seconds
+        self.refresh_ahead_seconds = refresh_ahead_seconds
+        self.interval_seconds = interval_seconds
+        self.max_refreshes_per_minute = max_refreshes_per_minute
+        self.decay_seconds = decay_seconds
+        self.is_busy = is_busy or (lambda: False)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warmer")
+        self._queued: Set[str] = set()
+        self._lock = threading.Lock()
+        self._tokens = max_refreshes_per_minute
+        self._last_fill = time.monotonic()
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.refreshed = 0
+        self.failed = 0
+        self.skipped_busy = 0
+
+    def track(self, brand_model: str) -> None:
+        """Count one request for a product."""
+        key = canonical_key(brand_model)
+        with self._lock:
+            self.top.offer(key, self.sketch.add(key))
+
+    def preload(self, products: Iterable[str]) -> None:
+        """Pin known products so they are computed at startup and kept fresh."""
+        with self._lock:
+            for product in products:
+                if product.strip():
+                    self.pinned.add(canonical_key(product))
+
+    def _take_token(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(
+            self.max_refreshes_per_minute,
+            self._tokens + (now - self._last_fill) * self.max_refreshes_per_minute / 60.0,
+        )
+        self._last_fill = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def due(self) -> List[str]:
+        """Keys to refresh now, soonest-expiring (or missing) first.
+
+        These are pinned products and tracked products with at least
+        ``min_requests`` requests that are missing (never computed, evicted
+        or failed) or expire within the refresh window. Keys backing off
+        after failures are skipped until their retry time.
+        """
+        now = time.monotonic()
+        with self._lock:
+            hot = [k for k, count in self.top.counts.items() if count >= self.min_requests]
+            candidates = set(hot) | self.pinned
+            backing_off = {k for k, (_, retry_at) in self._backoff.items() if retry_at > now}
+        deadline = time.time() + self.refresh_ahead_seconds
+        due = []
+        for key in candidates - backing_off:
+            info = self.cache.peek(key)
+            if info is None:
+                due.append((0.0, key))
+            elif info.expires_at <= deadline:
+                due.append((info.expires_at, key))
+        due.sort()
+        return [key for _, key in due]
+
+    def _refresh(self, key: str) -> None:
+        try:
+            self.cache.refresh(key)
+            self.refreshed += 1
+            with self._lock:
+                self._backoff.pop(key, None)
+        except Exception as e:
+            self.failed += 1
+            with self._lock:
+                failures = self._backoff.get(key, (0, 0.0))[0] + 1
+                delay = min(self.interval_seconds * 2 ** failures, self.max_backoff_seconds)
+                self._backoff[key] = (failures, time.monotonic() + delay)
+            logger.warning(f"Refresh of {key} failed ({failures} in a row, retrying in {delay:.0f}s): {e}")
+        finally:
+            with self._lock:
+                self._queued.discard(key)
+
+    def run_once(self) -> int:
+        """Queue refreshes for due entries within the rate cap.
+
+        Returns:
+            Number of refreshes queued.
+        """
+        if self.is_busy():
+            self.skipped_busy += 1
+            return 0
+        queued = 0
+        for key in self.due():
+            with self._lock:
+                if key in self._queued:
+                    continue
+                if not self._take_token():
+                    break
+                self._queued.add(key)
+            self._executor.submit(self._refresh, key)
+            queued += 1
+        return queued
+
+    async def _loop(self) -> None:
+        last_decay = time.monotonic()
+        while True:
+            try:
+                self.run_once()
+                if time.monotonic() - last_decay >= self.decay_seconds:
+                    with self._lock:
+                        self.sketch.decay()
+                        self.top.decay()
+                        # Forget failures of products nobody asks for any more
+                        for key in [k for k in self._backoff if k not in self.top.counts and k not in self.pinned]:
+                            del self._backoff[key]
+                    last_decay = time.monotonic()
+            except Exception as e:
+                logger.warning(f"Warmer pass failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self) -> None:
+        """Start the background loop on the running event loop."""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self) -> None:
+        """Stop the loop; refreshes already running are left to finish."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            hottest = [(key, self.top.counts[key]) for key in self.top.keys()[:10]]
+            return {
+                "tracked": len(self.top.counts),
+                "pinned": len(self.pinned),
+                "queued": len(self._queued),
+                "backing_off": len(self._backoff),
+                "refreshed": self.refreshed,
+                "failed": self.failed,
+                "skipped_busy": self.skipped_busy,
+                "hottest": hottest,
+            }
+
+
+def read_product_list(path: Path) -> List[str]:
+    """Read a preload list: one ``brand-model`` per line, ``#`` for comments."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
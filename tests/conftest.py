@@ -0,0 +1,4 @@
+import os
+
+# OpenAIService refuses to start without a key; no test reaches the API
+os.environ.setdefault("METIS_OPENAI_KEY", "test-key")
@@ -0,0 +1,57 @@
+"""Regression tests for the deadline plumbing of the chat routes."""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.api import browsing_agent
+from app.services.deadline import Deadline
+
+
+class FakeOpenAIService:
+    def __init__(self):
+        self.deadlines = []
+
+    def create_chat_completion(self, messages, deadline=None):
+        self.deadlines.append(deadline)
+        return {"choices": [{"message": {"role": "assistant", "content": "hi"}}]}
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app, raise_server_exceptions=False) as client:
+        yield client
+
+
+def test_chat_passes_deadline(client):
+    service = FakeOpenAIService()
+    main.app.dependency_overrides[main.get_openai_service] = lambda: service
+    try:
+        response = client.post(
+            "/chat",
+            json={"messages": [{"role": "user", "content": "hello"}]},
+            headers={"X-Request-Timeout": "5"},
+        )
+    finally:
+        main.app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.json()["choices"][0]["message"]["content"] == "hi"
+    assert isinstance(service.deadlines[0], Deadline)
+    assert service.deadlines[0].timeout == 5
+
+
+def test_agent_chat_passes_deadline(client, monkeypatch):
+    calls = []
+
+    def chat(message, temperature=None, max_tokens=None, deadline=None, tools=None):
+        calls.append((message, deadline))
+        return "hi"
+
+    monkeypatch.setattr(browsing_agent.browsing_agent, "chat", chat)
+    response = client.post("/agent/chat", json={"message": "hello"})
+
+    assert response.status_code == 200
+    assert response.json()["response"] == "hi"
+    assert calls[0][0] == "hello"
+    assert isinstance(calls[0][1], Deadline)
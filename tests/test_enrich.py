@@ -0,0 +1,60 @@
+"""Tests for the resumable enrichment journal and catalog reader."""
+
+import json
+
+from app import enrich
+from app.enrich import EnrichState
+
+
+def test_state_resumes_after_torn_tail(tmp_path):
+    path = tmp_path / "out.jsonl.state"
+    state = EnrichState(path)
+    state.record_product("acme widget", "A widget.", "Buy it.")
+    state.record_done("1")
+    state.close()
+    with open(path, "ab") as f:
+        f.write(b'{"product": "torn", "descr')
+
+    state = EnrichState(path)
+    state.record_product("acme gadget", "A gadget.", "Skip it.")
+    state.record_done("2")
+    assert state.product("acme gadget") == ("A gadget.", "Skip it.")
+    state.close()
+
+    state = EnrichState(path)
+    assert state.done == {"1", "2"}
+    assert state.product("acme widget") == ("A widget.", "Buy it.")
+    assert state.product("acme gadget") == ("A gadget.", "Skip it.")
+    assert not state.has_product("torn")
+    state.close()
+
+
+class FakeClassifier:
+    def run(self, inp, timeout=None):
+        return None
+
+
+def test_malformed_line_is_reported_and_rest_is_read(tmp_path, monkeypatch):
+    monkeypatch.setattr(enrich, "ProductClassifierAgent", FakeClassifier)
+    catalog = tmp_path / "catalog.jsonl"
+    catalog.write_text('{"id": "a", "title": "x"}\n{not json\n{"id": "c", "title": "y"}\n')
+    output = tmp_path / "out.jsonl"
+
+    assert enrich.main([str(catalog), "-o", str(output)]) == 0
+
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [row["id"] for row in rows] == ["a", "c"]
+
+
+def test_reader_failure_exits_non_zero(tmp_path, monkeypatch):
+    monkeypatch.setattr(enrich, "ProductClassifierAgent", FakeClassifier)
+
+    def broken_items(*args, **kwargs):
+        yield 1, {"id": "a", "title": "x"}
+        raise OSError("disk went away")
+
+    monkeypatch.setattr(enrich, "read_items", broken_items)
+    output = tmp_path / "out.jsonl"
+
+    assert enrich.main([str(tmp_path / "catalog.jsonl"), "-o", str(output), "--no-count"]) == 1
+    assert [json.loads(line)["id"] for line in output.read_text().splitlines()] == ["a"]
@@ -0,0 +1,46 @@
+"""Tests for the input limits of POST /topic/identify."""
+
+import struct
+import zlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.api import topic
+
+
+def png_header(width, height):
+    """The signature and IHDR chunk of a PNG, enough for Pillow to read its size."""
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    chunk = b"IHDR" + ihdr
+    iend = struct.pack(">I", 0) + b"IEND" + struct.pack(">I", zlib.crc32(b"IEND"))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + struct.pack(">I", len(ihdr)) + chunk + struct.pack(">I", zlib.crc32(chunk))
+        + iend
+    )
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app, raise_server_exceptions=False) as client:
+        yield client
+
+
+@pytest.mark.parametrize("size", [(10000, 10000), (20000, 20000)])
+def test_oversized_image_header_is_413(client, size):
+    response = client.post(
+        "/topic/identify",
+        content=png_header(*size),
+        headers={"Content-Type": "image/png"},
+    )
+    assert response.status_code == 413
+
+
+@pytest.mark.parametrize("content_type", ["text/plain", "application/json"])
+def test_oversized_text_body_is_413(client, content_type):
+    body = b'{"text": "' + b"x" * 1_000_000 + b'"}'
+    response = client.post("/topic/identify", content=body, headers={"Content-Type": content_type})
+    assert response.status_code == 413
+    assert str(topic._max_text_bytes()) in response.json()["detail"]
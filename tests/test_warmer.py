@@ -0,0 +1,58 @@
+"""Tests for the refresh-ahead warmer's choice of keys to refresh."""
+
+from app.services.product_cache import ProductCache
+from app.services.warmer import RefreshAheadWarmer
+
+
+def make_warmer(compute, max_entries=10):
+    cache = ProductCache(ttl_seconds=3600, max_entries=max_entries, compute=compute)
+    return RefreshAheadWarmer(cache, refresh_ahead_seconds=60, interval_seconds=30)
+
+
+def test_failed_preload_is_retried_after_backoff():
+    failing = {"acme widget"}
+
+    def compute(key):
+        if key in failing:
+            raise RuntimeError("upstream down")
+        return "description", "summary"
+
+    warmer = make_warmer(compute)
+    warmer.preload(["Acme Widget"])
+    assert warmer.due() == ["acme widget"]
+
+    warmer._refresh("acme widget")
+    assert warmer.due() == []
+
+    # Once the backoff delay has passed, the key is due again
+    failures, _ = warmer._backoff["acme widget"]
+    warmer._backoff["acme widget"] = (failures, 0.0)
+    assert warmer.due() == ["acme widget"]
+
+    failing.clear()
+    warmer._refresh("acme widget")
+    assert warmer.cache.peek("acme widget") is not None
+    assert warmer.due() == []
+    assert "acme widget" not in warmer._backoff
+
+
+def test_evicted_pinned_product_is_recomputed():
+    warmer = make_warmer(lambda key: ("description", "summary"), max_entries=1)
+    warmer.preload(["acme widget"])
+    warmer._refresh("acme widget")
+    warmer.cache.refresh("acme gadget")
+
+    assert warmer.cache.peek("acme widget") is None
+    assert warmer.due() == ["acme widget"]
+
+
+def test_one_off_products_are_not_refreshed():
+    warmer = make_warmer(lambda key: ("description", "summary"))
+    warmer.track("one-off typo product")
+    for _ in range(3):
+        warmer.track("acme widget")
+
+    assert warmer.due() == ["acme widget"]
+    for _ in range(2):
+        warmer.top.decay()
+    assert "one-off typo product" not in warmer.top.counts